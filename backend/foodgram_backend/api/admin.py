@@ -1,7 +1,7 @@
 from django.contrib import admin
 
 from .models import (Favorite, Ingredient, Recipe, RecipeIngredient, RecipeTag,
-                     ShoppingCart, Subscription, Tag, User)
+                     ShoppingCart, ShoppingListItem, Subscription, Tag, User)
 
 
 @admin.register(User)
@@ -12,10 +12,13 @@ class UserAdmin(admin.ModelAdmin):
         'email',
         'first_name',
         'last_name',
-        'avatar'
+        'avatar',
+        'recipes_count',
+        'subscribers_count'
     )
     search_fields = ('username', 'email', 'first_name', 'last_name')
     list_filter = ('is_staff', 'is_superuser', 'is_active', 'groups')
+    readonly_fields = ('recipes_count', 'subscribers_count')
     ordering = ('username',)
 
 
@@ -43,7 +46,15 @@ class IngredientAdmin(admin.ModelAdmin):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'author', 'cooking_time')
+    list_display = (
+        'id',
+        'name',
+        'author',
+        'cooking_time',
+        'favorites_count',
+        'in_carts_count'
+    )
+    readonly_fields = ('favorites_count', 'in_carts_count')
     search_fields = ('name', 'author__username', 'tags__name')
     list_filter = ('tags', 'author')
     ordering = ('name',)
@@ -79,3 +90,10 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'recipe__name')
     list_filter = ('user', 'recipe')
     ordering = ('user',)
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'ingredient', 'amount')
+    search_fields = ('user__username', 'ingredient__name')
+    ordering = ('user',)
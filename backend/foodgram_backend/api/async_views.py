@@ -0,0 +1,289 @@
+"""Асинхронные представления для режима ASGI.
+
+Чтение идет через асинхронный ORM, поэтому один рабочий процесс
+обслуживает много медленных клиентов одновременно. Все, что эти
+представления не обрабатывают сами (запись, курсорная пагинация,
+ошибки авторизации и валидации), передается синхронным представлениям
+DRF, чтобы ответы в обоих режимах совпадали.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db.models import Value
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .filters import RecipeFilter
+from .models import Favorite, Recipe, ShoppingCart, Subscription, User
+from .pagination import (COUNT_EXACT, CustomPageNumberPagination,
+                         count_queryset, get_count_mode)
+from .relations import add_relations, remove_relations
+from .renderers import JSONRenderer
+from .representations import get_recipe_representations, get_recipe_rows
+from .serializers import ShortRecipeSerializer, SubscribedUserSerializer
+from .views import RecipeViewSet, UserViewSet
+
+
+class SyncFallback(Exception):
+    """Запрос нужно отдать синхронному представлению."""
+
+
+async def aget_user(request):
+    """Аналог TokenAuthentication на асинхронном ORM.
+
+    None означает некорректный токен: ответ с ошибкой формирует
+    синхронное представление.
+    """
+    auth = request.META.get('HTTP_AUTHORIZATION', '').split()
+    if not auth or auth[0].lower() != 'token':
+        return AnonymousUser()
+    if len(auth) != 2:
+        return None
+    token = await Token.objects.select_related('user').filter(
+        key=auth[1]
+    ).afirst()
+    if token is None or not token.user.is_active:
+        return None
+    return token.user
+
+
+def async_view(sync_view, methods=('GET',)):
+    def decorator(handler):
+        @wraps(handler)
+        async def view(request, *args, **kwargs):
+            if request.method in methods:
+                user = await aget_user(request)
+                if user is not None:
+                    drf_request = Request(request)
+                    drf_request.user = user
+                    try:
+                        return await handler(drf_request, *args, **kwargs)
+                    except SyncFallback:
+                        pass
+            return await sync_to_async(sync_view)(request, *args, **kwargs)
+
+        view.csrf_exempt = True
+        return view
+    return decorator
+
+
+def render_response(data, status_code=status.HTTP_200_OK):
+    response = HttpResponse(
+        JSONRenderer().render(data),
+        content_type='application/json',
+        status=status_code
+    )
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+async def paginate(request, queryset):
+    """Страница в формате CustomPageNumberPagination."""
+    paginator = CustomPageNumberPagination()
+    if paginator.is_cursor_mode(request):
+        raise SyncFallback
+    page_size = paginator.get_page_size(request)
+    if not page_size:
+        return None, [item async for item in queryset]
+    number = request.query_params.get(paginator.page_query_param, '1')
+    if not number.isdigit() or int(number) < 1:
+        raise SyncFallback
+    number = int(number)
+    bottom = (number - 1) * page_size
+    items = [
+        item async for item in queryset[bottom:bottom + page_size + 1]
+    ]
+    if not items and number > 1:
+        raise SyncFallback
+    count_mode = get_count_mode(request, settings.API_PAGINATION_COUNT)
+    if count_mode == COUNT_EXACT:
+        count = await queryset.acount()
+    else:
+        count = await sync_to_async(count_queryset)(queryset, count_mode)
+    url = request.build_absolute_uri()
+    page = {
+        'count': count,
+        'next': (
+            replace_query_param(
+                url, paginator.page_query_param, number + 1
+            ) if len(items) > page_size else None
+        ),
+        'previous': (
+            None if number == 1
+            else remove_query_param(url, paginator.page_query_param)
+            if number == 2
+            else replace_query_param(
+                url, paginator.page_query_param, number - 1
+            )
+        ),
+    }
+    return page, items[:page_size]
+
+
+def paginated_response(page, data):
+    if page is None:
+        return render_response(data)
+    return render_response({**page, 'results': data})
+
+
+@async_view(RecipeViewSet.as_view(
+    {'get': 'list', 'post': 'create'},
+    basename='recipes',
+    detail=False
+))
+async def recipe_list(request):
+    filterset = RecipeFilter(
+        request.query_params,
+        Recipe.objects.for_viewer(request.user),
+        request=request
+    )
+    if not await sync_to_async(filterset.is_valid)():
+        raise SyncFallback
+    page, rows = await paginate(request, get_recipe_rows(filterset.qs))
+    return paginated_response(
+        page,
+        await sync_to_async(get_recipe_representations)(rows, request)
+    )
+
+
+@async_view(RecipeViewSet.as_view(
+    {
+        'get': 'retrieve',
+        'put': 'update',
+        'patch': 'partial_update',
+        'delete': 'destroy'
+    },
+    basename='recipes',
+    detail=True
+))
+async def recipe_detail(request, pk):
+    etag, last_modified = await sync_to_async(
+        RecipeViewSet().get_conditional_validators
+    )(request, pk=pk)
+    if etag is None:
+        raise SyncFallback
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=timestamp
+    )
+    if response is None:
+        row = await get_recipe_rows(
+            Recipe.objects.for_viewer(request.user).filter(pk=pk)
+        ).afirst()
+        representations = await sync_to_async(get_recipe_representations)(
+            [row] if row else [], request
+        )
+        if not representations:
+            raise SyncFallback
+        response = render_response(representations[0])
+    response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    patch_vary_headers(response, ('Authorization',))
+    return response
+
+
+@async_view(UserViewSet.as_view(
+    {'get': 'subscriptions'},
+    basename='users',
+    detail=False,
+    **UserViewSet.subscriptions.kwargs
+))
+async def subscriptions(request):
+    if request.user.is_anonymous:
+        raise SyncFallback
+    page, authors = await paginate(
+        request,
+        User.objects.filter(subscribers__user=request.user).annotate(
+            is_subscribed=Value(True)
+        ).order_by('id')
+    )
+    context = {'request': request}
+    context['page_recipes'] = await sync_to_async(
+        SubscribedUserSerializer(context=context).get_page_recipes
+    )([author.id for author in authors])
+    return paginated_response(
+        page,
+        SubscribedUserSerializer(authors, many=True, context=context).data
+    )
+
+
+async def relation_action(request, model, target_model, serializer_class,
+                          pk):
+    if request.user.is_anonymous:
+        raise SyncFallback
+    instance = await target_model.objects.filter(pk=pk).afirst()
+    if instance is None:
+        raise SyncFallback
+    if request.method == 'POST':
+        if not await sync_to_async(add_relations)(
+            model, request.user.id, [instance.id]
+        ):
+            return render_response(
+                {'detail': f'{instance} уже добавлен.'},
+                status.HTTP_400_BAD_REQUEST
+            )
+        serializer = serializer_class(instance, context={'request': request})
+        return render_response(
+            await sync_to_async(lambda: serializer.data)(),
+            status.HTTP_201_CREATED
+        )
+    if not await sync_to_async(remove_relations)(
+        model, request.user.id, [instance.id]
+    ):
+        return render_response(
+            {'detail': f'{instance} не найден.'},
+            status.HTTP_400_BAD_REQUEST
+        )
+    return render_response(
+        {'detail': f'{instance} удален.'},
+        status.HTTP_204_NO_CONTENT
+    )
+
+
+def relation_view(viewset, action, basename):
+    return viewset.as_view(
+        {'post': action, 'delete': action},
+        basename=basename,
+        detail=True,
+        **getattr(viewset, action).kwargs
+    )
+
+
+@async_view(
+    relation_view(RecipeViewSet, 'favorite', 'recipes'),
+    methods=('POST', 'DELETE')
+)
+async def favorite(request, pk):
+    return await relation_action(
+        request, Favorite, Recipe, ShortRecipeSerializer, pk
+    )
+
+
+@async_view(
+    relation_view(RecipeViewSet, 'shopping_cart', 'recipes'),
+    methods=('POST', 'DELETE')
+)
+async def shopping_cart(request, pk):
+    return await relation_action(
+        request, ShoppingCart, Recipe, ShortRecipeSerializer, pk
+    )
+
+
+@async_view(
+    relation_view(UserViewSet, 'subscribe', 'users'),
+    methods=('POST', 'DELETE')
+)
+async def subscribe(request, pk):
+    return await relation_action(
+        request, Subscription, User, SubscribedUserSerializer, pk
+    )
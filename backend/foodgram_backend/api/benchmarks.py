@@ -0,0 +1,440 @@
+"""Замеры горячих эндпоинтов API на сгенерированном наборе данных.
+
+Запуск: python manage.py test api.benchmarks
+
+Для каждого эндпоинта проверяется бюджет запросов к БД и медиана
+времени ответа относительно базовой линии из benchmarks.json (с запасом
+BENCHMARK_TOLERANCE). BENCHMARK_UPDATE_BASELINE=1 перезаписывает базовую
+линию текущими результатами вместо проверки.
+
+recipe_list_walk обходит WALK_PAGES страниц по 100 рецептов: бюджет
+запросов ловит вытеснение кэша рецептов между страницами.
+
+Сборка страницы из 100 рецептов сравнивается для RecipeSerializer и
+быстрого пути на values_list с кэшем рецептов (записи
+serialize_recipe_page:drf, :values и :values_cold с пустым кэшем).
+
+Отдельно сравниваются рендерер и парсер JSON на orjson со стандартными
+из DRF (записи :stdlib и :orjson) на странице рецептов и на теле
+рецепта с картинкой в несколько мегабайт.
+
+Эндпоинты чтения замеряются и в режиме ASGI через асинхронные
+представления (записи с суффиксом :async). Сравнение под нагрузкой
+многих клиентов на запущенных серверах делает команда loadtest.
+"""
+import base64
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from functools import partial
+from http import HTTPStatus
+from io import BytesIO
+from pathlib import Path
+
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from PIL import Image
+from rest_framework import parsers, renderers
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from .counters import reconcile_counters
+from .indexes import ingredient_index
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient, RecipeTag,
+                     ShoppingCart, Subscription, Tag, User)
+from .parsers import JSONParser
+from .renderers import JSONRenderer
+from .representations import (get_recipe_cache, get_recipe_representations,
+                              get_recipe_rows)
+from .serializers import RecipeSerializer
+
+BASELINE_PATH = Path(__file__).with_name('benchmarks.json')
+USERS = int(os.getenv('BENCHMARK_USERS', 2000))
+RECIPES = int(os.getenv('BENCHMARK_RECIPES', 5000))
+INGREDIENTS = int(os.getenv('BENCHMARK_INGREDIENTS', 2000))
+RUNS = int(os.getenv('BENCHMARK_RUNS', 15))
+WALK_PAGES = int(os.getenv('BENCHMARK_WALK_PAGES', 20))
+TOLERANCE = float(os.getenv('BENCHMARK_TOLERANCE', 3))
+UPDATE_BASELINE = os.getenv('BENCHMARK_UPDATE_BASELINE') == '1'
+# Медленные машины CI не должны падать из-за долей миллисекунды.
+MIN_LATENCY_MS = 5
+LARGE_IMAGE_SIZE = int(os.getenv('BENCHMARK_LARGE_IMAGE_SIZE', 1024))
+TAG_SLUGS = ('breakfast', 'lunch', 'dinner', 'dessert', 'snack')
+
+
+def make_image(size=64):
+    # Шум не сжимается, поэтому размер PNG близок к size * size * 3.
+    content = BytesIO()
+    Image.frombytes(
+        'RGB',
+        (size, size),
+        random.Random(size).randbytes(size * size * 3)
+    ).save(content, 'PNG')
+    return (
+        'data:image/png;base64,'
+        + base64.b64encode(content.getvalue()).decode()
+    )
+
+
+class BenchmarkCase(TestCase):
+    suffix = ''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(
+            MEDIA_ROOT=cls.media_root,
+            IMAGE_VARIANTS_ENABLED=False
+        )
+        cls.settings_override.enable()
+        cls.results = {}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        cls.report()
+
+    @classmethod
+    def setUpTestData(cls):
+        generator = random.Random(20240601)
+        users = User.objects.bulk_create(
+            User(
+                username=f'user{index}',
+                email=f'user{index}@example.com',
+                first_name='Имя',
+                last_name='Фамилия'
+            )
+            for index in range(USERS)
+        )
+        cls.reader = users[0]
+        cls.token = Token.objects.create(user=cls.reader)
+        tags = Tag.objects.bulk_create(
+            Tag(name=slug, slug=slug) for slug in TAG_SLUGS
+        )
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {index}', measurement_unit='г')
+            for index in range(INGREDIENTS)
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=users[index % USERS],
+                name=f'Рецепт {index}',
+                image='recipe.png',
+                text='Описание рецепта',
+                cooking_time=generator.randint(5, 120)
+            )
+            for index in range(RECIPES)
+        )
+        RecipeIngredient.objects.bulk_create(
+            (
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient=ingredient,
+                    amount=generator.randint(1, 500)
+                )
+                for recipe in recipes
+                for ingredient in generator.sample(ingredients, 6)
+            ),
+            batch_size=5000
+        )
+        RecipeTag.objects.bulk_create(
+            (
+                RecipeTag(recipe=recipe, tag=tag)
+                for recipe in recipes
+                for tag in generator.sample(tags, 2)
+            ),
+            batch_size=5000
+        )
+        for model, count in ((Favorite, 5), (ShoppingCart, 2)):
+            model.objects.bulk_create(
+                (
+                    model(user=user, recipe=recipe)
+                    for user in users
+                    for recipe in generator.sample(recipes, count)
+                ),
+                batch_size=5000
+            )
+        Subscription.objects.bulk_create(
+            (
+                Subscription(user=user, subscribed_to=author)
+                for user in users
+                for author in generator.sample(users[1:], 10)
+                if author != user
+            ),
+            batch_size=5000
+        )
+        reconcile_counters()
+        call_command('rebuild_shopping_lists', stdout=open(os.devnull, 'w'))
+        cls.recipe = recipes[len(recipes) // 2]
+        cls.own_recipe = recipes[0]
+        cls.tags = tags
+        cls.ingredients = ingredients[:3]
+
+    def setUp(self):
+        self.headers = {'authorization': f'Token {self.token.key}'}
+        ingredient_index.invalidate()
+
+    def send(self, method, *args, **kwargs):
+        return getattr(self.client, method)(*args, **kwargs)
+
+    def benchmark(self, name, request):
+        """Замеряет запрос: один прогрев, подсчет запросов и RUNS замеров."""
+        request()
+        with CaptureQueriesContext(connection) as queries:
+            request()
+        query_count = len(queries)
+        timings = []
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            request()
+            timings.append((time.perf_counter() - start) * 1000)
+        name += self.suffix
+        result = {
+            'queries': query_count,
+            'latency_ms': round(statistics.median(timings), 2),
+        }
+        self.results[name] = result
+        if UPDATE_BASELINE:
+            return
+        baseline = self.load_baseline().get(name)
+        self.assertIsNotNone(
+            baseline,
+            f'Нет базовой линии для {name}: запустите с '
+            'BENCHMARK_UPDATE_BASELINE=1.'
+        )
+        self.assertLessEqual(
+            result['queries'],
+            baseline['queries'],
+            f'{name}: превышен бюджет запросов к БД.'
+        )
+        self.assertLessEqual(
+            result['latency_ms'],
+            max(baseline['latency_ms'] * TOLERANCE, MIN_LATENCY_MS),
+            f'{name}: время ответа хуже базовой линии.'
+        )
+
+    @staticmethod
+    def load_baseline():
+        if not BASELINE_PATH.exists():
+            return {}
+        return json.loads(BASELINE_PATH.read_text(encoding='utf-8'))
+
+    @classmethod
+    def report(cls):
+        if not cls.results:
+            return
+        for name, result in sorted(cls.results.items()):
+            sys.stderr.write(
+                f'{name:<36} {result["queries"]:>4} запр. '
+                f'{result["latency_ms"]:>9.2f} мс\n'
+            )
+        if UPDATE_BASELINE:
+            BASELINE_PATH.write_text(
+                json.dumps(
+                    dict(sorted({
+                        **cls.load_baseline(),
+                        **cls.results
+                    }.items())),
+                    ensure_ascii=False,
+                    indent=2
+                ) + '\n',
+                encoding='utf-8'
+            )
+
+    def get(self, url, data=None, authorized=True):
+        headers = self.headers if authorized else {}
+
+        def request():
+            response = self.send('get', url, data, headers=headers)
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            if response.streaming:
+                b''.join(response)
+        return request
+
+
+class ReadBenchmarksMixin:
+    def test_recipe_list(self):
+        self.benchmark(
+            'recipe_list_anonymous',
+            self.get('/api/recipes/', {'limit': 6}, authorized=False)
+        )
+        self.benchmark(
+            'recipe_list_authenticated',
+            self.get('/api/recipes/', {'limit': 6})
+        )
+        self.benchmark(
+            'recipe_list_tags',
+            self.get(
+                '/api/recipes/',
+                {'limit': 6, 'tags': [tag.slug for tag in self.tags[:2]]}
+            )
+        )
+
+    def test_recipe_list_walk(self):
+        pages = [
+            self.get('/api/recipes/', {'limit': 100, 'page': page})
+            for page in range(1, WALK_PAGES + 1)
+        ]
+
+        def walk():
+            for page in pages:
+                page()
+
+        self.benchmark('recipe_list_walk', walk)
+
+    def test_recipe_detail(self):
+        self.benchmark(
+            'recipe_detail',
+            self.get(f'/api/recipes/{self.recipe.id}/')
+        )
+
+    def test_subscriptions(self):
+        self.benchmark(
+            'subscriptions',
+            self.get(
+                '/api/users/subscriptions/',
+                {'limit': 6, 'recipes_limit': 3}
+            )
+        )
+
+
+class EndpointBenchmarks(ReadBenchmarksMixin, BenchmarkCase):
+    def test_ingredient_autocomplete(self):
+        self.benchmark(
+            'ingredient_autocomplete',
+            self.get('/api/ingredients/', {'name': 'инг'}, authorized=False)
+        )
+
+    def test_shopping_list_download(self):
+        self.benchmark(
+            'shopping_list_download',
+            self.get('/api/recipes/download_shopping_cart/')
+        )
+
+    def get_recipe_payload(self, name, image):
+        return {
+            'name': name,
+            'text': 'Описание рецепта',
+            'cooking_time': 15,
+            'image': image,
+            'tags': [tag.id for tag in self.tags[:2]],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 10}
+                for ingredient in self.ingredients
+            ],
+        }
+
+    def post_recipe(self, name, image):
+        response = self.client.post(
+            '/api/recipes/',
+            json.dumps(self.get_recipe_payload(name, image)),
+            content_type='application/json',
+            headers=self.headers
+        )
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+
+    def test_recipe_create_and_update(self):
+        image = make_image()
+        large_image = make_image(LARGE_IMAGE_SIZE)
+        counter = iter(range(RUNS * 6))
+
+        def update():
+            payload = self.get_recipe_payload(
+                f'Правка {next(counter)}', image
+            )
+            del payload['image']
+            response = self.client.patch(
+                f'/api/recipes/{self.own_recipe.id}/',
+                json.dumps(payload),
+                content_type='application/json',
+                headers=self.headers
+            )
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+
+        self.benchmark(
+            'recipe_create',
+            lambda: self.post_recipe(f'Новый {next(counter)}', image)
+        )
+        self.benchmark(
+            'recipe_create_large_image',
+            lambda: self.post_recipe(f'Большой {next(counter)}', large_image)
+        )
+        self.benchmark('recipe_update', update)
+
+    def test_recipe_page_serialization(self):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = self.reader
+        queryset = Recipe.objects.for_viewer(self.reader)
+        self.benchmark(
+            'serialize_recipe_page:drf',
+            lambda: RecipeSerializer(
+                queryset[:100], many=True, context={'request': request}
+            ).data
+        )
+
+        def serialize():
+            return get_recipe_representations(
+                list(get_recipe_rows(queryset)[:100]), request
+            )
+
+        self.benchmark('serialize_recipe_page:values', serialize)
+        self.benchmark(
+            'serialize_recipe_page:values_cold',
+            lambda: (get_recipe_cache().clear(), serialize())
+        )
+
+    def test_json_codec(self):
+        page = self.client.get(
+            '/api/recipes/', {'limit': 100}, headers=self.headers
+        ).json()
+        body = json.dumps(
+            self.get_recipe_payload('Большой', make_image(LARGE_IMAGE_SIZE))
+        ).encode()
+        codecs = (
+            ('stdlib', renderers.JSONRenderer(), parsers.JSONParser()),
+            ('orjson', JSONRenderer(), JSONParser()),
+        )
+        for name, renderer, parser in codecs:
+            self.benchmark(
+                f'render_recipe_page:{name}',
+                partial(renderer.render, page)
+            )
+            self.benchmark(
+                f'parse_recipe_post:{name}',
+                lambda parser=parser: parser.parse(BytesIO(body))
+            )
+
+
+class AsyncEndpointBenchmarks(ReadBenchmarksMixin, BenchmarkCase):
+    suffix = ':async'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.urlconf_override = override_settings(
+            ROOT_URLCONF='foodgram_backend.async_urls'
+        )
+        cls.urlconf_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.urlconf_override.disable()
+
+    def send(self, method, *args, **kwargs):
+        async def send():
+            return await getattr(self.async_client, method)(*args, **kwargs)
+
+        return async_to_sync(send)()
@@ -0,0 +1,94 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+
+class LRUBackend:
+    """Кэш в памяти процесса с вытеснением давно не использованных ключей."""
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize or settings.RESPONSE_CACHE_SIZE
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DjangoCacheBackend:
+    """Общий кэш Django (Redis, memcached или LocMemCache в тестах).
+
+    Ключи содержат версию каталога, поэтому устаревшие записи не
+    удаляются явно, а вытесняются по таймауту.
+    """
+
+    def __init__(self, alias=None, timeout=None):
+        self.cache = caches[alias or settings.RESPONSE_CACHE_ALIAS]
+        self.timeout = timeout or settings.RESPONSE_CACHE_TIMEOUT
+
+    def get(self, key):
+        return self.cache.get(f'response:{key}')
+
+    def set(self, key, value):
+        self.cache.set(f'response:{key}', value, self.timeout)
+
+    def clear(self):
+        pass
+
+
+class ResponseCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get_or_render(self, key, render):
+        content = self.backend.get(key)
+        with self._lock:
+            if content is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if content is not None:
+            return content, True
+        content = render()
+        self.backend.set(key, content)
+        return content, False
+
+    def invalidate(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': type(self.backend).__name__,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+response_cache = ResponseCache(
+    import_string(settings.RESPONSE_CACHE_BACKEND)()
+)
@@ -0,0 +1,71 @@
+from django.apps import apps as global_apps
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Favorite, Recipe, ShoppingCart, Subscription, User
+
+# Модель-источник: поле с id владельца счетчика, модель и поле счетчика.
+COUNTERS = {
+    Favorite: ('recipe_id', Recipe, 'favorites_count'),
+    ShoppingCart: ('recipe_id', Recipe, 'in_carts_count'),
+    Subscription: ('subscribed_to_id', User, 'subscribers_count'),
+    Recipe: ('author_id', User, 'recipes_count'),
+}
+RECONCILE_CHUNK_SIZE = 500
+
+
+def change_counter(source, ids, delta):
+    _, model, field = COUNTERS[source]
+    if ids and delta:
+        model.objects.filter(pk__in=ids).update(
+            **{field: Greatest(F(field) + delta, 0)}
+        )
+
+
+def change_counters(source, counts):
+    """Применяет {id владельца: изменение}, по запросу на каждое значение."""
+    ids_by_delta = {}
+    for pk, delta in counts.items():
+        ids_by_delta.setdefault(delta, []).append(pk)
+    for delta, ids in ids_by_delta.items():
+        change_counter(source, ids, delta)
+
+
+def reconcile_counters(apps=global_apps, dry_run=False):
+    """Сверяет счетчики с таблицами связей и исправляет расхождения.
+
+    Возвращает {поле счетчика: число исправленных строк}. Принимает
+    реестр моделей, чтобы его можно было вызвать из миграции.
+    """
+    drift = {}
+    for source, (id_field, model, field) in COUNTERS.items():
+        source = apps.get_model(source._meta.label)
+        model = apps.get_model(model._meta.label)
+        owner_field = id_field.removesuffix('_id')
+        actual = Coalesce(
+            Subquery(
+                source.objects.filter(
+                    **{owner_field: OuterRef('pk')}
+                ).order_by().values(owner_field).annotate(
+                    total=Count('pk')
+                ).values('total')
+            ),
+            0
+        )
+        ids = list(
+            model.objects.annotate(actual=actual).exclude(
+                **{field: F('actual')}
+            ).values_list('pk', flat=True)
+        )
+        drift[field] = len(ids)
+        if dry_run:
+            continue
+        for start in range(0, len(ids), RECONCILE_CHUNK_SIZE):
+            model.objects.filter(
+                pk__in=ids[start:start + RECONCILE_CHUNK_SIZE]
+            ).update(**{field: actual})
+    return drift
+
+
+def fill_counters(apps, schema_editor):
+    reconcile_counters(apps)
@@ -0,0 +1,91 @@
+from operator import itemgetter
+
+from django.conf import settings
+
+from .models import FeedEntry, Recipe, Subscription, User
+
+
+def fan_out_recipe(recipe):
+    """Раскладывает новый рецепт по лентам подписчиков автора.
+
+    Рецепты авторов, у которых больше FEED_FANOUT_LIMIT подписчиков, не
+    раскладываются: они подмешиваются в ленту при чтении.
+    """
+    if User.objects.filter(
+        pk=recipe.author_id,
+        subscribers_count__gt=settings.FEED_FANOUT_LIMIT
+    ).exists():
+        return
+    subscriber_ids = Subscription.objects.filter(
+        subscribed_to_id=recipe.author_id
+    ).values_list('user_id', flat=True)
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user_id, recipe=recipe, created=recipe.created)
+            for user_id in subscriber_ids
+        ),
+        ignore_conflicts=True,
+        batch_size=1000
+    )
+    Recipe.objects.filter(pk=recipe.pk).update(fanned_out=True)
+
+
+def backfill_feed(user_id, author_id):
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user_id, recipe_id=recipe_id, created=created)
+            for recipe_id, created in Recipe.objects.filter(
+                author_id=author_id,
+                fanned_out=True
+            ).values_list('id', 'created')[:settings.FEED_BACKFILL]
+        ),
+        ignore_conflicts=True
+    )
+
+
+def clear_feed(user_id, author_id):
+    FeedEntry.objects.filter(
+        user_id=user_id,
+        recipe__author_id=author_id
+    ).delete()
+
+
+def trim_feed(user_id, entries):
+    """Удаляет из ленты записи старше FEED_SIZE последних."""
+    if len(entries) > settings.FEED_SIZE:
+        FeedEntry.objects.filter(
+            user_id=user_id,
+            created__lt=entries[settings.FEED_SIZE - 1][1]
+        ).delete()
+
+
+def get_feed(user):
+    """Последние FEED_SIZE рецептов ленты.
+
+    Разложенная лента читается по индексу (user, -created) и сливается
+    с последними рецептами популярных авторов, поэтому цена чтения не
+    зависит от размера таблицы рецептов.
+    """
+    entries = list(
+        FeedEntry.objects.filter(user=user).order_by(
+            '-created'
+        ).values_list('recipe_id', 'created')[:settings.FEED_SIZE + 1]
+    )
+    trim_feed(user.id, entries)
+    pulled = Recipe.objects.filter(
+        fanned_out=False,
+        author__in=Subscription.objects.filter(user=user).values(
+            'subscribed_to'
+        )
+    ).order_by('-created', '-id').values_list(
+        'id',
+        'created'
+    )[:settings.FEED_SIZE]
+    recipe_ids = [
+        recipe_id for recipe_id, _ in sorted(
+            [*entries[:settings.FEED_SIZE], *pulled],
+            key=itemgetter(1),
+            reverse=True
+        )[:settings.FEED_SIZE]
+    ]
+    return Recipe.objects.filter(id__in=recipe_ids)
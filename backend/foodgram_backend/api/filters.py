@@ -1,6 +1,7 @@
 from django_filters.rest_framework import FilterSet, filters
 
 from .models import Ingredient, Recipe, Tag
+from .search import search_recipes
 
 
 class RecipeFilter(FilterSet):
@@ -13,6 +14,10 @@ class RecipeFilter(FilterSet):
         method='filter_is_in_shopping_cart'
     )
     is_favorited = filters.NumberFilter(method='filter_is_favorited')
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.OrderingFilter(
+        fields=('created', 'favorites_count', 'in_carts_count')
+    )
 
     class Meta:
         model = Recipe
@@ -23,7 +28,6 @@ class RecipeFilter(FilterSet):
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         user = self.request.user
-        print(type(value))
         if value == 1 and not user.is_anonymous:
             return queryset.filter(shoppingcart__user=user)
         elif value == 0:
@@ -38,6 +42,9 @@ class RecipeFilter(FilterSet):
             return queryset.exclude(favorite__user=user)
         return queryset
 
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
 
 class IngredientFilter(FilterSet):
     name = filters.CharFilter(lookup_expr='startswith')
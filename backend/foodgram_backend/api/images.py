@@ -0,0 +1,152 @@
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'variants'
+SOURCE_KEY = 'source'
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_image_format():
+    if settings.IMAGE_VARIANT_FORMAT == 'WEBP' and features.check('webp'):
+        return 'WEBP'
+    return 'JPEG'
+
+
+def get_variant_name(name, variant, extension):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return f'{VARIANTS_DIR}/{stem}_{variant}.{extension}'
+
+
+def get_variant_names(name):
+    return [
+        get_variant_name(name, variant, extension)
+        for variant in settings.IMAGE_VARIANTS
+        for extension in EXTENSIONS.values()
+    ]
+
+
+def render_variants(source_path, media_root, name, sizes, image_format,
+                    quality):
+    """Сохраняет уменьшенные копии изображения рядом с media_root.
+
+    Выполняется в отдельном процессе, поэтому работает только с файлами
+    и не обращается к базе данных.
+    """
+    os.makedirs(os.path.join(media_root, VARIANTS_DIR), exist_ok=True)
+    variants = {}
+    with Image.open(source_path) as source:
+        image = ImageOps.exif_transpose(source).convert('RGB')
+    for variant, size in sizes.items():
+        resized = image.copy()
+        resized.thumbnail(size, Image.LANCZOS)
+        variant_name = get_variant_name(
+            name, variant, EXTENSIONS[image_format]
+        )
+        resized.save(
+            os.path.join(media_root, variant_name),
+            image_format,
+            quality=quality
+        )
+        variants[variant] = variant_name
+    return variants
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_VARIANT_WORKERS
+            )
+        return _executor
+
+
+def store_variants(recipe_id, name, variants):
+    variants[SOURCE_KEY] = name
+    Recipe.objects.filter(pk=recipe_id, image=name).update(
+        image_variants=variants,
+        updated=timezone.now()
+    )
+
+
+def store_future_variants(recipe_id, name, future):
+    try:
+        store_variants(recipe_id, name, future.result())
+    except Exception:
+        logger.exception(
+            'Не удалось подготовить изображения рецепта %s', recipe_id
+        )
+    finally:
+        connection.close()
+
+
+def generate_variants(recipe_id, name):
+    args = (
+        default_storage.path(name),
+        settings.MEDIA_ROOT,
+        name,
+        settings.IMAGE_VARIANTS,
+        get_image_format(),
+        settings.IMAGE_VARIANT_QUALITY
+    )
+    if not settings.IMAGE_VARIANT_WORKERS:
+        try:
+            store_variants(recipe_id, name, render_variants(*args))
+        except Exception:
+            logger.exception(
+                'Не удалось подготовить изображения рецепта %s', recipe_id
+            )
+        return
+    get_executor().submit(render_variants, *args).add_done_callback(
+        partial(store_future_variants, recipe_id, name)
+    )
+
+
+def schedule_variants(recipe):
+    """Ставит генерацию копий в очередь после фиксации транзакции."""
+    if not settings.IMAGE_VARIANTS_ENABLED or not recipe.image:
+        return
+    if (recipe.image_variants or {}).get(SOURCE_KEY) == recipe.image.name:
+        return
+    transaction.on_commit(
+        partial(generate_variants, recipe.id, recipe.image.name)
+    )
+
+
+def get_variant_urls(recipe, request=None):
+    return get_image_variant_urls(
+        recipe.image.name, recipe.image_variants, request
+    )
+
+
+def get_image_variant_urls(name, variants, request=None):
+    """Адреса копий изображения; пока их нет, отдается оригинал."""
+    variants = variants or {}
+    if variants.get(SOURCE_KEY) != name:
+        variants = {}
+    urls = {}
+    for variant in settings.IMAGE_VARIANTS:
+        url = (
+            default_storage.url(variants[variant]) if variant in variants
+            else default_storage.url(name) if name else None
+        )
+        if url is not None and request is not None:
+            url = request.build_absolute_uri(url)
+        urls[variant] = url
+    return urls
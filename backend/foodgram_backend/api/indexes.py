@@ -0,0 +1,92 @@
+import hashlib
+import json
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple
+
+from django.conf import settings
+
+from .models import Ingredient
+
+
+def render_ingredient(ingredient_id, name, measurement_unit):
+    return json.dumps(
+        {'id': ingredient_id, 'name': name,
+         'measurement_unit': measurement_unit},
+        ensure_ascii=False,
+        separators=(',', ':')
+    ).encode()
+
+
+IndexState = namedtuple(
+    'IndexState',
+    ('keys', 'fragments', 'built_at', 'version')
+)
+
+
+class IngredientIndex:
+    """Префиксный индекс названий ингредиентов в памяти процесса.
+
+    Хранит отсортированные названия в casefold и заранее отрендеренные
+    JSON-фрагменты. Перестраивается после изменения ингредиентов
+    (сигналы) или по истечении ttl секунд, если ингредиенты менялись в
+    другом процессе. Версия индекса — хеш его содержимого, поэтому она
+    одинакова во всех процессах, в отличие от времени сборки.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._state = None
+
+    def invalidate(self):
+        self._state = None
+
+    def warm(self):
+        self._get_state()
+
+    def all(self):
+        return self._get_state().fragments
+
+    def get_version(self):
+        return self._get_state().version
+
+    def search(self, query):
+        keys, fragments = self._get_state()[:2]
+        prefix = query.casefold()
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + chr(0x10FFFF), start)
+        substring_matches = [
+            fragment
+            for position, (key, fragment) in enumerate(zip(keys, fragments))
+            if prefix in key and not start <= position < end
+        ]
+        return fragments[start:end] + substring_matches
+
+    def _get_state(self):
+        state = self._state
+        if state is None or time.monotonic() - state.built_at > self.ttl:
+            with self._lock:
+                if self._state is state:
+                    self._state = self._build()
+                state = self._state
+        return state
+
+    def _build(self):
+        entries = sorted(
+            (name.casefold(), render_ingredient(pk, name, measurement_unit))
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        )
+        fragments = [fragment for _, fragment in entries]
+        return IndexState(
+            [key for key, _ in entries],
+            fragments,
+            time.monotonic(),
+            hashlib.sha1(b'\n'.join(fragments)).hexdigest()
+        )
+
+
+ingredient_index = IngredientIndex(ttl=settings.INGREDIENT_INDEX_TTL)
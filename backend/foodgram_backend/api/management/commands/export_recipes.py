@@ -0,0 +1,75 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...models import Recipe
+
+
+def serialize_recipe(recipe):
+    author = recipe.author
+    return {
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'image': recipe.image.name,
+        'author': {
+            'email': author.email,
+            'username': author.username,
+            'first_name': author.first_name,
+            'last_name': author.last_name,
+        },
+        'tags': [
+            {'name': recipe_tag.tag.name, 'slug': recipe_tag.tag.slug}
+            for recipe_tag in recipe.recipe_tags.all()
+        ],
+        'ingredients': [
+            {
+                'name': recipe_ingredient.ingredient.name,
+                'measurement_unit':
+                    recipe_ingredient.ingredient.measurement_unit,
+                'amount': recipe_ingredient.amount,
+            }
+            for recipe_ingredient in recipe.recipe_ingredients.all()
+        ],
+    }
+
+
+class Command(BaseCommand):
+    help = 'Выгружает рецепты в NDJSON: одна строка на рецепт.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            type=str,
+            help='Файл для выгрузки; "-" означает стандартный вывод.'
+        )
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('Размер пакета должен быть больше нуля.')
+        recipes = Recipe.objects.with_related().order_by('id').iterator(
+            chunk_size=options['batch_size']
+        )
+        path = options['path']
+        file = (
+            sys.stdout if path == '-'
+            else open(path, 'w', encoding='utf-8')
+        )
+        exported = 0
+        try:
+            for recipe in recipes:
+                file.write(json.dumps(
+                    serialize_recipe(recipe),
+                    ensure_ascii=False,
+                    separators=(',', ':')
+                ))
+                file.write('\n')
+                exported += 1
+        finally:
+            if file is not sys.stdout:
+                file.close()
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгрузка завершена! Рецептов: {exported}.'
+        ))
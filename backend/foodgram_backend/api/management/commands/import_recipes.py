@@ -0,0 +1,238 @@
+import json
+from collections import Counter
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ...counters import change_counters
+from ...models import (Ingredient, Recipe, RecipeIngredient, RecipeTag, Tag,
+                       User)
+from ...versions import INGREDIENTS_VERSION, TAGS_VERSION, bump_versions
+
+RECIPE_FIELDS = {'name': str, 'text': str, 'cooking_time': int}
+AUTHOR_FIELDS = {'email': str}
+TAG_FIELDS = {'name': str, 'slug': str}
+INGREDIENT_FIELDS = {'name': str, 'measurement_unit': str, 'amount': int}
+
+
+def find_field_error(item, fields, label):
+    if not isinstance(item, dict):
+        return f'{label}: ожидается объект'
+    for field, field_type in fields.items():
+        value = item.get(field)
+        if not isinstance(value, field_type) or isinstance(value, bool):
+            return f'{label}: нет поля {field} или у него неверный тип'
+    return None
+
+
+def find_record_error(record):
+    """Описание первой ошибки в записи или None."""
+    error = find_field_error(record, RECIPE_FIELDS, 'рецепт')
+    if error:
+        return error
+    if not isinstance(record.get('image', ''), str):
+        return 'рецепт: у поля image неверный тип'
+    error = find_field_error(record.get('author'), AUTHOR_FIELDS, 'автор')
+    if error:
+        return error
+    for key, fields, label in (
+        ('tags', TAG_FIELDS, 'тег'),
+        ('ingredients', INGREDIENT_FIELDS, 'ингредиент'),
+    ):
+        items = record.get(key, [])
+        if not isinstance(items, list):
+            return f'{key}: ожидается список'
+        for item in items:
+            error = find_field_error(item, fields, label)
+            if error:
+                return error
+    return None
+
+
+class Command(BaseCommand):
+    help = 'Загружает рецепты из NDJSON, выгруженного export_recipes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str)
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('Размер пакета должен быть больше нуля.')
+        self.authors = {}
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.ingredients = {
+            (name, measurement_unit): pk
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        }
+        self.changed_versions = set()
+        self.skipped = 0
+        imported = 0
+        with open(options['path'], encoding='utf-8') as file:
+            lines = (
+                (number, line) for number, line in enumerate(file, 1)
+                if line.strip()
+            )
+            while True:
+                batch = list(islice(lines, options['batch_size']))
+                if not batch:
+                    break
+                records = []
+                for number, line in batch:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        error = 'некорректный JSON'
+                    else:
+                        error = find_record_error(record)
+                    if error is None:
+                        records.append((number, record))
+                    else:
+                        self.skip(number, error)
+                imported += self.import_batch(records)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'Загружено рецептов: {imported}.')
+        if self.changed_versions:
+            bump_versions(*self.changed_versions)
+        self.stdout.write(self.style.SUCCESS(
+            f'Загрузка завершена! Рецептов: {imported}, '
+            f'пропущено: {self.skipped}.'
+        ))
+
+    def skip(self, number, reason):
+        self.skipped += 1
+        self.stderr.write(f'Строка {number} пропущена: {reason}.')
+
+    def import_batch(self, numbered_records):
+        records = [record for _, record in numbered_records]
+        self.resolve_authors(records)
+        self.resolve_tags(records)
+        self.resolve_ingredients(records)
+        recipes, relations = [], []
+        for number, record in numbered_records:
+            author = record['author']
+            author_id = self.authors.get(author['email'])
+            if author_id is None:
+                self.skip(
+                    number,
+                    f'автор {author["email"]} не создан, имя пользователя '
+                    f'{author.get("username") or author["email"]} уже занято'
+                )
+                continue
+            recipes.append(Recipe(
+                author_id=author_id,
+                name=record['name'],
+                text=record['text'],
+                cooking_time=record['cooking_time'],
+                image=record.get('image', '')
+            ))
+            amounts = {}
+            for item in record.get('ingredients', ()):
+                ingredient_id = self.ingredients[
+                    item['name'], item['measurement_unit']
+                ]
+                amounts[ingredient_id] = (
+                    amounts.get(ingredient_id, 0) + item['amount']
+                )
+            relations.append((
+                amounts,
+                {
+                    self.tags[tag['slug']] for tag in record.get('tags', ())
+                    if tag['slug'] in self.tags
+                }
+            ))
+        with transaction.atomic():
+            Recipe.objects.bulk_create(recipes)
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe_id=recipe.id,
+                    ingredient_id=ingredient_id,
+                    amount=amount
+                )
+                for recipe, (amounts, _) in zip(recipes, relations)
+                for ingredient_id, amount in amounts.items()
+            )
+            RecipeTag.objects.bulk_create(
+                RecipeTag(recipe_id=recipe.id, tag_id=tag_id)
+                for recipe, (_, tag_ids) in zip(recipes, relations)
+                for tag_id in tag_ids
+            )
+            change_counters(
+                Recipe,
+                Counter(recipe.author_id for recipe in recipes)
+            )
+        return len(recipes)
+
+    def resolve_authors(self, records):
+        missing = {
+            record['author']['email']: record['author']
+            for record in records
+            if record['author']['email'] not in self.authors
+        }
+        if not missing:
+            return
+        self.authors.update(
+            User.objects.filter(email__in=missing).values_list('email', 'id')
+        )
+        password = make_password(None)
+        User.objects.bulk_create(
+            (
+                User(
+                    email=email,
+                    username=author.get('username') or email,
+                    first_name=author.get('first_name', ''),
+                    last_name=author.get('last_name', ''),
+                    password=password
+                )
+                for email, author in missing.items()
+                if email not in self.authors
+            ),
+            ignore_conflicts=True
+        )
+        self.authors.update(
+            User.objects.filter(email__in=missing).values_list('email', 'id')
+        )
+
+    def resolve_tags(self, records):
+        missing = {
+            tag['slug']: tag['name']
+            for record in records
+            for tag in record.get('tags', ())
+            if tag['slug'] not in self.tags
+        }
+        if not missing:
+            return
+        Tag.objects.bulk_create(
+            (Tag(name=name, slug=slug) for slug, name in missing.items()),
+            ignore_conflicts=True
+        )
+        self.changed_versions.add(TAGS_VERSION)
+        self.tags.update(
+            Tag.objects.filter(slug__in=missing).values_list('slug', 'id')
+        )
+
+    def resolve_ingredients(self, records):
+        missing = {
+            (item['name'], item['measurement_unit'])
+            for record in records
+            for item in record.get('ingredients', ())
+            if (item['name'], item['measurement_unit']) not in self.ingredients
+        }
+        if not missing:
+            return
+        Ingredient.objects.bulk_create(
+            (
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in missing
+            ),
+            ignore_conflicts=True
+        )
+        self.changed_versions.add(INGREDIENTS_VERSION)
+        for pk, name, measurement_unit in Ingredient.objects.filter(
+            name__in={name for name, _ in missing}
+        ).values_list('id', 'name', 'measurement_unit'):
+            self.ingredients[name, measurement_unit] = pk
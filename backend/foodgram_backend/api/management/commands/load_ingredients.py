@@ -1,22 +1,118 @@
 import csv
+import json
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 from ...models import Ingredient
+from ...versions import INGREDIENTS_VERSION, bump_versions
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def iter_csv(file):
+    for row in csv.reader(file):
+        yield row
+
+
+def iter_json(file):
+    """Читает JSON-массив объектов по частям, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(READ_CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидался JSON-массив ингредиентов.')
+    position = 1
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(READ_CHUNK_SIZE)
+            if not chunk:
+                raise CommandError('Файл JSON оборван или поврежден.')
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item.get('name'), item.get('measurement_unit')
+
+
+READERS = {
+    'csv': iter_csv,
+    'json': iter_json,
+}
 
 
 class Command(BaseCommand):
+    help = 'Загружает ингредиенты из CSV или JSON пакетами.'
+
     def add_arguments(self, parser):
-        parser.add_argument('csv_file', type=str)
+        parser.add_argument('path', type=str)
+        parser.add_argument(
+            '--format',
+            choices=READERS,
+            help='Формат файла; по умолчанию определяется по расширению.'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать новые ингредиенты, ничего не записывая.'
+        )
 
     def handle(self, *args, **options):
-        csv_file_path = options['csv_file']
-        with open(csv_file_path, newline='', encoding='utf-8') as csvfile:
-            reader = csv.reader(csvfile)
-            for row in reader:
-                name, measurement_unit = row
-                Ingredient.objects.get_or_create(
-                    name=name,
-                    measurement_unit=measurement_unit
-                )
-        self.stdout.write(self.style.SUCCESS('Загрузка завершена!'))
+        path = Path(options['path'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path.name}.')
+        if options['batch_size'] < 1:
+            raise CommandError('Размер пакета должен быть больше нуля.')
+        total = created = skipped = 0
+        with open(path, newline='', encoding='utf-8') as file:
+            rows = READERS[file_format](file)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                total += len(batch)
+                ingredients = {}
+                for row in batch:
+                    if len(row) != 2 or not all(row):
+                        skipped += 1
+                        continue
+                    name, measurement_unit = (
+                        str(value).strip() for value in row
+                    )
+                    ingredients[name, measurement_unit] = None
+                created += self.save_batch(list(ingredients), options)
+                if options['verbosity'] > 0:
+                    self.stdout.write(
+                        f'Обработано строк: {total}, новых: {created}.'
+                    )
+        if created and not options['dry_run']:
+            bump_versions(INGREDIENTS_VERSION)
+        action = 'будет добавлено' if options['dry_run'] else 'добавлено'
+        self.stdout.write(self.style.SUCCESS(
+            f'Загрузка завершена! Строк: {total}, {action}: {created}, '
+            f'пропущено: {skipped}.'
+        ))
+
+    def save_batch(self, pairs, options):
+        existing = set(
+            Ingredient.objects.filter(
+                name__in={name for name, _ in pairs}
+            ).values_list('name', 'measurement_unit')
+        )
+        new_pairs = [pair for pair in pairs if pair not in existing]
+        if new_pairs and not options['dry_run']:
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in new_pairs
+                ),
+                ignore_conflicts=True
+            )
+        return len(new_pairs)
@@ -0,0 +1,80 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, percent):
+    return values[min(len(values) - 1, len(values) * percent // 100)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает запущенный сервер параллельными запросами. Несколько '
+        'адресов вида sync=URL async=URL сравниваются между собой.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('targets', nargs='+', type=str)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--token', type=str, default=None)
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError(
+                'Число клиентов и запросов должно быть больше нуля.'
+            )
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+        for target in options['targets']:
+            name, _, url = target.partition('=')
+            if '://' not in url:
+                name, url = target, target
+            self.stdout.write(self.format_result(name, *self.run(
+                url,
+                headers,
+                options['concurrency'],
+                options['requests'],
+                options['timeout']
+            )))
+
+    def run(self, url, headers, concurrency, count, timeout):
+        local = threading.local()
+
+        def fetch(_):
+            if not hasattr(local, 'session'):
+                local.session = requests.Session()
+            start = time.perf_counter()
+            try:
+                ok = local.session.get(
+                    url,
+                    headers=headers,
+                    timeout=timeout
+                ).status_code < 400
+            except requests.RequestException:
+                ok = False
+            return time.perf_counter() - start, ok
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(fetch, range(count)))
+        return results, time.perf_counter() - start
+
+    def format_result(self, name, results, elapsed):
+        latencies = sorted(duration * 1000 for duration, _ in results)
+        errors = sum(not ok for _, ok in results)
+        percentiles = ', '.join(
+            f'p{percent} {percentile(latencies, percent):.1f} мс'
+            for percent in PERCENTILES
+        )
+        return (
+            f'{name}: {len(results) / elapsed:.1f} запр./с, {percentiles}, '
+            f'ошибок: {errors}.'
+        )
@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ...models import ShoppingListItem
+from ...shopping_list import get_expected_shopping_lists
+
+
+class Command(BaseCommand):
+    help = 'Проверяет и пересобирает итоги списков покупок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сообщить о расхождениях, ничего не исправляя.'
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Ограничить проверку пользователем (можно повторять).'
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids']
+        expected = {}
+        for user_id, ingredient_id, total in get_expected_shopping_lists(
+            user_ids
+        ):
+            expected.setdefault(user_id, {})[ingredient_id] = total
+        stored = ShoppingListItem.objects.all()
+        if user_ids:
+            stored = stored.filter(user_id__in=user_ids)
+        actual = {}
+        for user_id, ingredient_id, amount in stored.values_list(
+            'user_id', 'ingredient_id', 'amount'
+        ).iterator():
+            actual.setdefault(user_id, {})[ingredient_id] = amount
+        drifted = sorted(
+            user_id for user_id in expected.keys() | actual.keys()
+            if expected.get(user_id) != actual.get(user_id)
+        )
+        for user_id in drifted:
+            self.stdout.write(f'Расхождение у пользователя {user_id}.')
+        if drifted and not options['verify']:
+            with transaction.atomic():
+                ShoppingListItem.objects.filter(user_id__in=drifted).delete()
+                ShoppingListItem.objects.bulk_create(
+                    (
+                        ShoppingListItem(
+                            user_id=user_id,
+                            ingredient_id=ingredient_id,
+                            amount=total
+                        )
+                        for user_id in drifted
+                        for ingredient_id, total in expected.get(
+                            user_id, {}
+                        ).items()
+                    ),
+                    batch_size=1000
+                )
+        if drifted and options['verify']:
+            self.stdout.write(self.style.WARNING(
+                f'Списков с расхождениями: {len(drifted)}.'
+            ))
+        elif drifted:
+            self.stdout.write(self.style.SUCCESS(
+                f'Исправлено списков: {len(drifted)}.'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from ...counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Сверяет счетчики рецептов и пользователей с таблицами связей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сообщить о расхождениях, ничего не исправляя.'
+        )
+
+    def handle(self, *args, **options):
+        drift = reconcile_counters(dry_run=options['verify'])
+        for field, count in drift.items():
+            self.stdout.write(f'{field}: расхождений {count}.')
+        action = 'найдено' if options['verify'] else 'исправлено'
+        self.stdout.write(self.style.SUCCESS(
+            f'Сверка завершена! Всего {action}: {sum(drift.values())}.'
+        ))
@@ -0,0 +1,140 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+
+current_timings = ContextVar('current_timings', default=None)
+
+
+class RequestTimings:
+    __slots__ = ('route', 'start', 'view_start', 'queries', 'durations')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.route = None
+        self.view_start = None
+        self.queries = 0
+        self.durations = {'db': 0.0, 'render': 0.0}
+
+    def add(self, name, duration):
+        self.durations[name] += duration
+
+
+def record_query(execute, sql, params, many, context):
+    """Обертка запросов к БД, которая ставится на соединение один раз.
+
+    Запрос приписывается метрике из контекста, а не соединению: в режиме
+    ASGI одно соединение может обслуживать несколько запросов к API.
+    """
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.queries += 1
+        timings.durations['db'] += time.perf_counter() - start
+
+
+@contextmanager
+def measure(name):
+    """Прибавляет время блока к метрике текущего запроса, если она есть."""
+    timings = current_timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+class Histogram:
+    __slots__ = ('bounds', 'buckets', 'count', 'total')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0
+
+    def observe(self, value):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.total, 3),
+            'buckets': {
+                **{
+                    str(bound): count
+                    for bound, count in zip(self.bounds, self.buckets)
+                },
+                '+Inf': self.buckets[-1],
+            },
+        }
+
+
+class RouteMetrics:
+    """Гистограммы длительности и числа запросов к БД по маршрутам.
+
+    Данные живут в памяти процесса: у каждого воркера gunicorn свои.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def observe(self, route, status_code, total, timings):
+        with self._lock:
+            histograms = self._routes.get(route)
+            if histograms is None:
+                histograms = self._routes[route] = {
+                    'latency_ms': Histogram(LATENCY_BUCKETS),
+                    'db_ms': Histogram(LATENCY_BUCKETS),
+                    'queries': Histogram(QUERY_BUCKETS),
+                    'errors': 0,
+                }
+            histograms['latency_ms'].observe(total * 1000)
+            histograms['db_ms'].observe(timings.durations['db'] * 1000)
+            histograms['queries'].observe(timings.queries)
+            if status_code >= 500:
+                histograms['errors'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'routes': {
+                    route: {
+                        name: (
+                            value if isinstance(value, int)
+                            else value.as_dict()
+                        )
+                        for name, value in histograms.items()
+                    }
+                    for route, histograms in sorted(self._routes.items())
+                },
+            }
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+route_metrics = RouteMetrics()
+
+
+def is_enabled():
+    return settings.METRICS_ENABLED
@@ -0,0 +1,159 @@
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.core.cache import caches
+from django.db import connections
+from django.http import JsonResponse
+
+from .metrics import RequestTimings, current_timings, is_enabled, route_metrics
+
+LIVENESS_PATH = '/healthz'
+READINESS_PATH = '/readyz'
+
+
+def get_readiness_failures():
+    failures = []
+    for connection in connections.all():
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except Exception:
+            failures.append(f'db:{connection.alias}')
+    try:
+        caches['default'].get(READINESS_PATH)
+    except Exception:
+        failures.append('cache:default')
+    return failures
+
+
+def readiness_response(failures):
+    if failures:
+        return JsonResponse(
+            {'status': 'unavailable', 'failures': failures},
+            status=503
+        )
+    return JsonResponse({'status': 'ok'})
+
+
+class HealthCheckMiddleware:
+    """Отвечает на пробы /healthz и /readyz раньше остальных middleware.
+
+    Пробы приходят с произвольным Host и без авторизации, поэтому не
+    проходят ALLOWED_HOSTS, сессии и метрики. /healthz не трогает БД,
+    /readyz делает SELECT 1 в обход ORM и проверяет кэш.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.path == LIVENESS_PATH:
+            return JsonResponse({'status': 'ok'})
+        if request.path == READINESS_PATH:
+            return readiness_response(get_readiness_failures())
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if request.path == LIVENESS_PATH:
+            return JsonResponse({'status': 'ok'})
+        if request.path == READINESS_PATH:
+            return readiness_response(
+                await sync_to_async(get_readiness_failures)()
+            )
+        return await self.get_response(request)
+
+
+def get_route_name(request, view_func):
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return getattr(view_func, '__name__', 'unknown')
+    method = request.method.lower()
+    action = getattr(view_func, 'actions', {}).get(method, method)
+    return f'{view_class.__name__}.{action}'
+
+
+class MetricsMiddleware:
+    """Считает запросы к БД и время этапов обработки запроса.
+
+    Итог отдается в заголовке Server-Timing и копится в гистограммах
+    маршрутов, которые показывает /api/_metrics/.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not is_enabled():
+            return self.get_response(request)
+        with self.track() as timings:
+            response = self.get_response(request)
+        return self.finish(response, timings)
+
+    async def __acall__(self, request):
+        if not is_enabled():
+            return await self.get_response(request)
+        with self.track() as timings:
+            response = await self.get_response(request)
+        return self.finish(response, timings)
+
+    @contextmanager
+    def track(self):
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        try:
+            yield timings
+        finally:
+            current_timings.reset(token)
+
+    def finish(self, response, timings):
+        end = time.perf_counter()
+        total = end - timings.start
+        response['Server-Timing'] = ', '.join((
+            f'db;desc="{timings.queries} queries";'
+            f'dur={timings.durations["db"] * 1000:.2f}',
+            f'view;dur={self.get_view_time(timings, end) * 1000:.2f}',
+            f'render;dur={timings.durations["render"] * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ))
+        if timings.route is not None:
+            route_metrics.observe(
+                timings.route,
+                response.status_code,
+                total,
+                timings
+            )
+        return response
+
+    def get_view_time(self, timings, end):
+        # Время представления без БД и рендеринга: в основном сериализация.
+        if timings.view_start is None:
+            return 0
+        return max(
+            end - timings.view_start
+            - timings.durations['db'] - timings.durations['render'],
+            0
+        )
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = current_timings.get()
+        if timings is None:
+            return None
+        timings.route = get_route_name(request, view_func)
+        timings.view_start = time.perf_counter()
+        return None
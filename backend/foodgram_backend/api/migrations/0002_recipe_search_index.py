@@ -0,0 +1,17 @@
+from django.db import migrations
+
+import api.search
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            api.search.create_search_index,
+            api.search.drop_search_index,
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.14 on 2026-10-17 06:00
+
+from django.db import migrations, models
+
+import api.search
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=256, unique=True, verbose_name='key')),
+                ('token', models.CharField(max_length=32, verbose_name='token')),
+                ('updated', models.DateTimeField(verbose_name='updated')),
+            ],
+            options={
+                'verbose_name': 'ContentVersion',
+                'verbose_name_plural': 'ContentVersions',
+            },
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, verbose_name='updated'),
+        ),
+        migrations.RunPython(
+            api.search.restore_search_index,
+            migrations.RunPython.noop,
+        ),
+    ]
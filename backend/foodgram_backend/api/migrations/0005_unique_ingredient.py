@@ -0,0 +1,59 @@
+# Generated by Django 4.2.14 on 2026-10-17 06:02
+
+from django.db import migrations, models
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('api', 'Ingredient')
+    RecipeIngredient = apps.get_model('api', 'RecipeIngredient')
+    ShoppingListItem = apps.get_model('api', 'ShoppingListItem')
+    duplicates = Ingredient.objects.values(
+        'name',
+        'measurement_unit'
+    ).annotate(
+        keep_id=models.Min('id'),
+        total=models.Count('id')
+    ).filter(total__gt=1)
+    for duplicate in duplicates:
+        keep_id = duplicate['keep_id']
+        extra_ids = list(
+            Ingredient.objects.filter(
+                name=duplicate['name'],
+                measurement_unit=duplicate['measurement_unit']
+            ).exclude(id=keep_id).values_list('id', flat=True)
+        )
+        for model, owner in (
+            (RecipeIngredient, 'recipe_id'),
+            (ShoppingListItem, 'user_id'),
+        ):
+            for row in model.objects.filter(ingredient_id__in=extra_ids):
+                kept = model.objects.filter(
+                    **{owner: getattr(row, owner)},
+                    ingredient_id=keep_id
+                ).first()
+                if kept is None:
+                    row.ingredient_id = keep_id
+                    row.save(update_fields=['ingredient'])
+                else:
+                    kept.amount += row.amount
+                    kept.save(update_fields=['amount'])
+                    row.delete()
+        Ingredient.objects.filter(id__in=extra_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_content_versions'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients,
+            migrations.RunPython.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.14 on 2026-10-17 06:08
+
+from django.db import migrations, models
+
+import api.search
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_recipe_created_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, verbose_name='image_variants'),
+        ),
+        migrations.RunPython(
+            api.search.restore_search_index,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.14 on 2026-10-17 06:14
+
+from django.db import migrations, models
+
+import api.counters
+import api.search
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='favorites_count'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='in_carts_count'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='recipes_count'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='subscribers_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='subscribers_count'),
+        ),
+        migrations.RunPython(
+            api.counters.fill_counters,
+            migrations.RunPython.noop,
+        ),
+        migrations.RunPython(
+            api.search.restore_search_index,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -1,38 +1,125 @@
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from rest_framework import status
 from rest_framework.response import Response
 
+from .cache import response_cache
+from .relations import add_relations, remove_relations
+from .renderers import RawJSON
+from .serializers import RelationIdsSerializer
+from .versions import get_versions, make_etag
+from .viewer import RELATED_ID_FIELDS
 
-class ActionMixin:
-    def handle_action(
-            self,
-            model,
-            serializer_class,
-            request, user_field='user',
-            **kwargs
-    ):
-        instance = self.get_object()
-        user = request.user
 
+class ConditionalGetMixin:
+    version_key = None
+    conditional_actions = ('list', 'retrieve')
+
+    def get_conditional_validators(self, request, *args, **kwargs):
+        token, updated = get_versions(self.version_key).get(
+            self.version_key,
+            ('', None)
+        )
+        return make_etag(self.version_key, token), updated
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        if self.action not in self.conditional_actions:
+            return handler(request, *args, **kwargs)
+        etag, last_modified = self.get_conditional_validators(
+            request, *args, **kwargs
+        )
+        self.etag = etag
+        if etag is None:
+            return handler(request, *args, **kwargs)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=timestamp
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (
+            status.HTTP_200_OK,
+            status.HTTP_304_NOT_MODIFIED
+        ):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+
+class CachedResponseMixin:
+    def cached_response(self, key, render):
+        content, hit = response_cache.get_or_render(key, render)
+        return Response(
+            RawJSON(content),
+            headers={'X-Cache': 'HIT' if hit else 'MISS'}
+        )
+
+
+class ActionMixin:
+    def handle_action(self, model, serializer_class, request, instance):
         if request.method == 'POST':
-            if model.objects.filter(**{user_field: user}, **kwargs).exists():
+            if not add_relations(model, request.user.id, [instance.id]):
                 return Response(
                     {'detail': f'{instance} уже добавлен.'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            model.objects.create(**{user_field: user}, **kwargs)
-            serializer = serializer_class(instance, context={
-                'request': request
-            }
+            serializer = serializer_class(
+                instance,
+                context={'request': request}
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        obj = model.objects.filter(**{user_field: user}, **kwargs).first()
-        if not obj:
+        if not remove_relations(model, request.user.id, [instance.id]):
             return Response(
                 {'detail': f'{instance} не найден.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        obj.delete()
         return Response(
             {'detail': f'{instance} удален.'},
             status=status.HTTP_204_NO_CONTENT
         )
+
+    def handle_batch_action(self, model, request):
+        serializer = RelationIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        user_id = request.user.id
+        if request.method == 'POST':
+            changed = add_relations(model, user_id, ids)
+            changed_status, existing_status = 'added', 'exists'
+            field = RELATED_ID_FIELDS[model]
+            existing = set(
+                model.objects.filter(
+                    user_id=user_id,
+                    **{f'{field}__in': set(ids) - changed}
+                ).values_list(field, flat=True)
+            ) if len(changed) < len(ids) else set()
+        else:
+            changed = remove_relations(model, user_id, ids)
+            changed_status, existing_status = 'removed', None
+            existing = set()
+        return Response({
+            'results': [
+                {
+                    'id': pk,
+                    'status': (
+                        changed_status if pk in changed
+                        else existing_status if pk in existing
+                        else 'not_found'
+                    )
+                }
+                for pk in ids
+            ]
+        })
@@ -1,7 +1,9 @@
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator
 from django.db import models
-from django.db.models import UniqueConstraint
+from django.db.models import (Exists, F, OuterRef, Prefetch, UniqueConstraint,
+                              Window)
+from django.db.models.functions import RowNumber
 
 from .utils import (LITERALS, MAX_LENGTH, MAX_LENGTH_EMAIL,
                     MAX_LENGTH_FIRST_NAME, MAX_LENGTH_LAST_NAME,
@@ -9,7 +11,31 @@ from .utils import (LITERALS, MAX_LENGTH, MAX_LENGTH_EMAIL,
                     validate_username)
 
 
-class User(AbstractUser):
+class CounterFieldsMixin:
+    """Не перезаписывает счетчики при обычном сохранении.
+
+    Счетчики меняются запросами F() в обход модели, поэтому значения в
+    памяти устаревают. Они сохраняются, только если явно переданы в
+    update_fields.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, update_fields=None, **kwargs):
+        if update_fields is None and not self._state.adding and not (
+            kwargs.get('force_insert')
+        ):
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred
+            ]
+        super().save(*args, update_fields=update_fields, **kwargs)
+
+
+class User(CounterFieldsMixin, AbstractUser):
     email = models.EmailField(
         unique=True,
         max_length=MAX_LENGTH_EMAIL,
@@ -34,6 +60,16 @@ class User(AbstractUser):
         verbose_name='last_name'
     )
     avatar = models.ImageField(null=True, blank=True, verbose_name='avatar')
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='recipes_count'
+    )
+    subscribers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='subscribers_count'
+    )
+
+    counter_fields = ('recipes_count', 'subscribers_count')
 
     class Meta:
         verbose_name = 'User'
@@ -102,12 +138,65 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ingredient'
         verbose_name_plural = 'Ingredients'
+        constraints = [
+            UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            )
+        ]
 
     def __str__(self):
         return self.name
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    def with_related(self):
+        return self.select_related('author').prefetch_related(
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+            Prefetch(
+                'recipe_tags',
+                queryset=RecipeTag.objects.select_related('tag')
+            )
+        )
+
+    def with_viewer_flags(self, user):
+        if user.is_anonymous:
+            return self
+        return self.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_author_subscribed=Exists(
+                Subscription.objects.filter(
+                    user=user,
+                    subscribed_to=OuterRef('author')
+                )
+            )
+        )
+
+    def for_viewer(self, user):
+        return self.with_related().with_viewer_flags(user)
+
+    def first_per_author(self, author_ids, limit=None):
+        queryset = self.filter(author_id__in=author_ids)
+        if limit is not None:
+            queryset = queryset.annotate(
+                author_row=Window(
+                    RowNumber(),
+                    partition_by=F('author'),
+                    order_by=(F('created').desc(), F('id').desc())
+                )
+            ).filter(author_row__lte=limit)
+        return queryset.order_by('author', '-created', '-id')
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -115,6 +204,11 @@ class Recipe(models.Model):
     )
     name = models.CharField(max_length=MAX_LENGTH, verbose_name='name')
     image = models.ImageField(verbose_name='image')
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='image_variants'
+    )
     ingredients = models.ManyToManyField(
         Ingredient,
         through='RecipeIngredient',
@@ -131,10 +225,35 @@ class Recipe(models.Model):
         ],
         verbose_name='cooking_time'
     )
+    created = models.DateTimeField(auto_now_add=True, verbose_name='created')
+    updated = models.DateTimeField(auto_now=True, verbose_name='updated')
+    fanned_out = models.BooleanField(default=False, verbose_name='fanned_out')
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='favorites_count'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='in_carts_count'
+    )
+
+    objects = RecipeQuerySet.as_manager()
+    counter_fields = ('favorites_count', 'in_carts_count')
 
     class Meta:
         verbose_name = 'Recipe'
         verbose_name_plural = 'Recipes'
+        ordering = ('-created', '-id')
+        indexes = [
+            models.Index(
+                fields=['-created', '-id'],
+                name='recipe_created_idx'
+            ),
+            models.Index(
+                fields=['author', '-created'],
+                name='recipe_author_created_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -235,3 +354,83 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return self.user
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='user'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='ingredient'
+    )
+    amount = models.BigIntegerField(verbose_name='amount')
+
+    class Meta:
+        verbose_name = 'ShoppingListItem'
+        verbose_name_plural = 'ShoppingListItems'
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient}'
+
+
+class ContentVersion(models.Model):
+    key = models.CharField(
+        max_length=MAX_LENGTH,
+        unique=True,
+        verbose_name='key'
+    )
+    token = models.CharField(max_length=32, verbose_name='token')
+    updated = models.DateTimeField(verbose_name='updated')
+
+    class Meta:
+        verbose_name = 'ContentVersion'
+        verbose_name_plural = 'ContentVersions'
+
+    def __str__(self):
+        return self.key
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='user'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='recipe'
+    )
+    created = models.DateTimeField(verbose_name='created')
+
+    class Meta:
+        verbose_name = 'FeedEntry'
+        verbose_name_plural = 'FeedEntries'
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-created'],
+                name='feed_entry_user_created_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.recipe_id}'
@@ -1,9 +1,158 @@
-from rest_framework.pagination import (LimitOffsetPagination,
+import json
+
+from django.conf import settings
+from django.core.paginator import EmptyPage, InvalidPage, Page, Paginator
+from django.db import connections
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (CursorPagination, LimitOffsetPagination,
                                        PageNumberPagination)
+from rest_framework.response import Response
+
+CURSOR_MODE = 'cursor'
+COUNT_EXACT = 'exact'
+COUNT_ESTIMATE = 'estimate'
+COUNT_NONE = 'none'
+COUNT_MODES = (COUNT_EXACT, COUNT_ESTIMATE, COUNT_NONE)
+
+
+def estimate_count(queryset):
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def get_count_mode(request, default):
+    count_mode = request.query_params.get('count', default)
+    return count_mode if count_mode in COUNT_MODES else default
+
+
+def count_queryset(queryset, count_mode):
+    if count_mode == COUNT_EXACT:
+        return queryset.count()
+    if count_mode == COUNT_ESTIMATE:
+        return estimate_count(queryset)
+    return None
+
+
+class UncountedPage(Page):
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+
+class UncountedPaginator(Paginator):
+    def page(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise InvalidPage('Номер страницы должен быть целым числом.')
+        if number < 1:
+            raise EmptyPage('Номер страницы меньше 1.')
+        bottom = (number - 1) * self.per_page
+        items = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not items and number > 1:
+            raise EmptyPage('Страница не содержит результатов.')
+        return UncountedPage(
+            items[:self.per_page],
+            number,
+            self,
+            len(items) > self.per_page
+        )
+
+
+class CustomCursorPagination(CursorPagination):
+    page_size = 10
+    page_size_query_param = 'limit'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+    ordering = '-id'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = count_queryset(
+            queryset,
+            get_count_mode(request, COUNT_NONE)
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        return tuple(getattr(view, 'cursor_ordering', (self.ordering,)))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data
+        })
 
 
 class CustomPageNumberPagination(PageNumberPagination):
     page_size_query_param = 'limit'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+    cursor_pagination_class = CustomCursorPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if self.is_cursor_mode(request):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        self.count_mode = get_count_mode(
+            request,
+            settings.API_PAGINATION_COUNT
+        )
+        if self.count_mode == COUNT_EXACT:
+            return super().paginate_queryset(queryset, request, view)
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        self.request = request
+        try:
+            self.page = UncountedPaginator(queryset, page_size).page(
+                request.query_params.get(self.page_query_param, 1)
+            )
+        except InvalidPage as exc:
+            raise NotFound(str(exc))
+        self.count = count_queryset(queryset, self.count_mode)
+        return list(self.page)
+
+    def is_cursor_mode(self, request):
+        return (
+            self.cursor_pagination_class.cursor_query_param
+            in request.query_params
+            or request.query_params.get(
+                'pagination',
+                settings.API_PAGINATION_MODE
+            ) == CURSOR_MODE
+        )
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        if self.count_mode == COUNT_EXACT:
+            return super().get_paginated_response(data)
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data
+        })
 
 
 class CustomLimitOffsetPagination(LimitOffsetPagination):
@@ -0,0 +1,28 @@
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from django.conf import settings
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+
+
+class JSONParser(parsers.JSONParser):
+    """Разбирает тело запроса через orjson, если он установлен.
+
+    Тела с рецептами несут картинки в base64 на несколько мегабайт, и
+    orjson разбирает их в разы быстрее стандартного json.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get(
+            'encoding',
+            settings.DEFAULT_CHARSET
+        )
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
@@ -0,0 +1,70 @@
+from django.db import connection, transaction
+from django.dispatch import Signal
+
+from .viewer import RELATED_ID_FIELDS
+
+# Отправляется после массового добавления или удаления связей
+# пользователя: sender — модель связи, added и removed — множества id.
+relations_changed = Signal()
+
+
+def get_relation_sql(model):
+    quote = connection.ops.quote_name
+    field = model._meta.get_field(RELATED_ID_FIELDS[model].removesuffix('_id'))
+    return (
+        quote(model._meta.db_table),
+        quote(model._meta.get_field('user').column),
+        quote(field.column),
+        quote(field.related_model._meta.db_table),
+        quote(field.target_field.column)
+    )
+
+
+def add_relations(model, user_id, ids):
+    """Создает связи одним INSERT ... ON CONFLICT DO NOTHING.
+
+    Возвращает id, для которых связь действительно появилась: уже
+    существующие связи и несуществующие объекты пропускаются.
+    """
+    if not ids:
+        return set()
+    table, user_column, column, target, target_column = get_relation_sql(
+        model
+    )
+    placeholders = ', '.join(['%s'] * len(ids))
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({user_column}, {column}) '
+                f'SELECT %s, {target_column} FROM {target} '
+                f'WHERE {target_column} IN ({placeholders}) '
+                f'ON CONFLICT DO NOTHING RETURNING {column}',
+                (user_id, *ids)
+            )
+            added = {row[0] for row in cursor.fetchall()}
+        if added:
+            relations_changed.send(
+                sender=model, user_id=user_id, added=added, removed=set()
+            )
+    return added
+
+
+def remove_relations(model, user_id, ids):
+    """Удаляет связи одним DELETE и возвращает id удаленных."""
+    if not ids:
+        return set()
+    table, user_column, column, _, _ = get_relation_sql(model)
+    placeholders = ', '.join(['%s'] * len(ids))
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE {user_column} = %s '
+                f'AND {column} IN ({placeholders}) RETURNING {column}',
+                (user_id, *ids)
+            )
+            removed = {row[0] for row in cursor.fetchall()}
+        if removed:
+            relations_changed.send(
+                sender=model, user_id=user_id, added=set(), removed=removed
+            )
+    return removed
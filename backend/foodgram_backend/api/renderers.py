@@ -0,0 +1,51 @@
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from rest_framework import renderers
+from rest_framework.utils.encoders import JSONEncoder
+
+from .metrics import measure
+
+LINE_SEPARATORS = (
+    (b'\xe2\x80\xa8', b'\\u2028'),
+    (b'\xe2\x80\xa9', b'\\u2029'),
+)
+
+encoder = JSONEncoder()
+
+
+class RawJSON(bytes):
+    """Уже готовый JSON: рендерер отдает его без повторной сериализации."""
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """Рендерер на orjson с тем же выводом, что у JSONRenderer из DRF.
+
+    Типы, которых orjson не знает (Decimal, ленивые строки и т. п.),
+    приводятся энкодером DRF. Ответы с отступами (browsable API) и
+    работа без orjson остаются на стандартном json.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with measure('render'):
+            if isinstance(data, RawJSON):
+                return bytes(data)
+            if (
+                orjson is None
+                or data is None
+                or self.get_indent(accepted_media_type, renderer_context or {})
+            ):
+                return super().render(
+                    data, accepted_media_type, renderer_context
+                )
+            content = orjson.dumps(
+                data,
+                default=encoder.default,
+                option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+            )
+            for separator, escaped in LINE_SEPARATORS:
+                if separator in content:
+                    content = content.replace(separator, escaped)
+            return content
@@ -0,0 +1,186 @@
+"""Чтение рецептов без моделей и полей DRF.
+
+Страница читается легкими строками: id, версия рецепта и флаги зрителя
+из аннотаций. Общая для всех зрителей часть рецепта (автор,
+ингредиенты, теги, относительные адреса файлов) берется из кэша одним
+get_many; промахи собираются из values_list и кладутся обратно. Запись
+в кэше хранит updated рецепта и не используется, если он изменился,
+поэтому устаревшие записи безопасны и в кэше другого процесса.
+Кэш отдельный (RECIPE_CACHE_ALIAS) и рассчитан на весь каталог
+(RECIPE_CACHE_SIZE), иначе обход страниц вытеснял бы свои же записи.
+"""
+from django.conf import settings
+from django.core.cache import caches
+
+from .images import get_image_variant_urls
+from .models import Recipe, RecipeIngredient, RecipeTag, User
+
+CACHE_PREFIX = 'recipe:'
+ROW_FIELDS = ('id', 'created', 'updated')
+RECIPE_FIELDS = (
+    'id',
+    'updated',
+    'name',
+    'image',
+    'image_variants',
+    'text',
+    'cooking_time',
+    'author_id',
+    'author__email',
+    'author__username',
+    'author__first_name',
+    'author__last_name',
+    'author__avatar',
+)
+FLAG_FIELDS = ('is_favorited', 'is_in_shopping_cart', 'is_author_subscribed')
+
+
+def get_recipe_rows(queryset):
+    """Строки рецептов вместо моделей; флаги зрителя берутся из аннотаций."""
+    flags = [
+        field for field in FLAG_FIELDS if field in queryset.query.annotations
+    ]
+    return queryset.prefetch_related(None).values(*ROW_FIELDS, *flags)
+
+
+def get_ingredient_rows(recipe_ids):
+    return RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by('id').values_list(
+        'recipe_id',
+        'ingredient_id',
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        'amount'
+    )
+
+
+def get_tag_rows(recipe_ids):
+    return RecipeTag.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by('id').values_list(
+        'recipe_id',
+        'tag_id',
+        'tag__slug',
+        'tag__name'
+    )
+
+
+def get_file_url(field, name):
+    return field.storage.url(name) if name else None
+
+
+def build_fragments(recipe_ids):
+    """Представления рецептов без флагов зрителя и с адресами без хоста."""
+    ingredients = {}
+    for recipe_id, pk, name, measurement_unit, amount in get_ingredient_rows(
+        recipe_ids
+    ):
+        ingredients.setdefault(recipe_id, []).append({
+            'id': pk,
+            'name': name,
+            'measurement_unit': measurement_unit,
+            'amount': amount
+        })
+    tags = {}
+    for recipe_id, pk, slug, name in get_tag_rows(recipe_ids):
+        tags.setdefault(recipe_id, []).append({
+            'id': pk,
+            'slug': slug,
+            'name': name
+        })
+    image_field = Recipe._meta.get_field('image')
+    avatar_field = User._meta.get_field('avatar')
+    return {
+        row['id']: (row['updated'], {
+            'id': row['id'],
+            'tags': tags.get(row['id'], []),
+            'author': {
+                'email': row['author__email'],
+                'id': row['author_id'],
+                'username': row['author__username'],
+                'first_name': row['author__first_name'],
+                'last_name': row['author__last_name'],
+                'is_subscribed': False,
+                'avatar': get_file_url(avatar_field, row['author__avatar']),
+            },
+            'ingredients': ingredients.get(row['id'], []),
+            'is_favorited': False,
+            'is_in_shopping_cart': False,
+            'name': row['name'],
+            'image': get_file_url(image_field, row['image']),
+            'image_variants': get_image_variant_urls(
+                row['image'], row['image_variants']
+            ),
+            'text': row['text'],
+            'cooking_time': row['cooking_time'],
+        })
+        for row in Recipe.objects.filter(id__in=recipe_ids).values(
+            *RECIPE_FIELDS
+        )
+    }
+
+
+def get_recipe_cache():
+    return caches[settings.RECIPE_CACHE_ALIAS]
+
+
+def get_fragments(rows):
+    cache = get_recipe_cache()
+    keys = {row['id']: f'{CACHE_PREFIX}{row["id"]}' for row in rows}
+    cached = cache.get_many(keys.values())
+    fragments = {}
+    for row in rows:
+        updated, fragment = cached.get(keys[row['id']], (None, None))
+        if updated == row['updated']:
+            fragments[row['id']] = fragment
+    missing = [row['id'] for row in rows if row['id'] not in fragments]
+    if missing:
+        built = build_fragments(missing)
+        cache.set_many(
+            {keys[pk]: entry for pk, entry in built.items()},
+            settings.RECIPE_CACHE_TIMEOUT
+        )
+        fragments.update(
+            (pk, fragment) for pk, (_, fragment) in built.items()
+        )
+    return fragments
+
+
+def forget_recipes(recipe_ids):
+    get_recipe_cache().delete_many(
+        [f'{CACHE_PREFIX}{pk}' for pk in recipe_ids]
+    )
+
+
+def add_viewer_fields(fragment, row, request):
+    def absolute(url):
+        if url is None or request is None:
+            return url
+        return request.build_absolute_uri(url)
+
+    author = fragment['author']
+    return {
+        **fragment,
+        'author': {
+            **author,
+            'is_subscribed': row.get('is_author_subscribed', False),
+            'avatar': absolute(author['avatar']),
+        },
+        'is_favorited': row.get('is_favorited', False),
+        'is_in_shopping_cart': row.get('is_in_shopping_cart', False),
+        'image': absolute(fragment['image']),
+        'image_variants': {
+            variant: absolute(url)
+            for variant, url in fragment['image_variants'].items()
+        },
+    }
+
+
+def get_recipe_representations(rows, request):
+    fragments = get_fragments(rows)
+    return [
+        add_viewer_fields(fragments[row['id']], row, request)
+        for row in rows
+        if row['id'] in fragments
+    ]
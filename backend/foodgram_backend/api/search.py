@@ -0,0 +1,153 @@
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+RECIPE_TABLE = 'api_recipe'
+SEARCH_TABLE = 'api_recipe_fts'
+SEARCH_CONFIG = 'pg_catalog.russian'
+
+POSTGRESQL_CREATE = (
+    f'ALTER TABLE {RECIPE_TABLE} '
+    'ADD COLUMN IF NOT EXISTS search_vector tsvector',
+    f"""
+    CREATE OR REPLACE FUNCTION {RECIPE_TABLE}_search_vector_update()
+    RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('{SEARCH_CONFIG}',
+                                  coalesce(NEW.name, '')), 'A')
+            || setweight(to_tsvector('{SEARCH_CONFIG}',
+                                     coalesce(NEW.text, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    f'DROP TRIGGER IF EXISTS {RECIPE_TABLE}_search_vector_trigger '
+    f'ON {RECIPE_TABLE}',
+    f"""
+    CREATE TRIGGER {RECIPE_TABLE}_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, text ON {RECIPE_TABLE}
+    FOR EACH ROW EXECUTE FUNCTION {RECIPE_TABLE}_search_vector_update()
+    """,
+    f'UPDATE {RECIPE_TABLE} SET name = name',
+    f'CREATE INDEX IF NOT EXISTS {RECIPE_TABLE}_search_vector_idx '
+    f'ON {RECIPE_TABLE} USING GIN (search_vector)',
+)
+POSTGRESQL_DROP = (
+    f'DROP TRIGGER IF EXISTS {RECIPE_TABLE}_search_vector_trigger '
+    f'ON {RECIPE_TABLE}',
+    f'DROP FUNCTION IF EXISTS {RECIPE_TABLE}_search_vector_update()',
+    f'ALTER TABLE {RECIPE_TABLE} DROP COLUMN IF EXISTS search_vector',
+)
+SQLITE_CREATE = (
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        name, text,
+        content='{RECIPE_TABLE}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_insert
+    AFTER INSERT ON {RECIPE_TABLE} BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_delete
+    AFTER DELETE ON {RECIPE_TABLE} BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_update
+    AFTER UPDATE OF name, text ON {RECIPE_TABLE} BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO {SEARCH_TABLE}(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')",
+)
+SQLITE_DROP = (
+    f'DROP TRIGGER IF EXISTS {SEARCH_TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {SEARCH_TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {SEARCH_TABLE}_update',
+    f'DROP TABLE IF EXISTS {SEARCH_TABLE}',
+)
+
+
+def create_search_index(apps, schema_editor):
+    """Создает поисковый индекс рецептов и триггеры, которые его ведут."""
+    statements = {
+        'postgresql': POSTGRESQL_CREATE,
+        'sqlite': SQLITE_CREATE,
+    }.get(schema_editor.connection.vendor, ())
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def restore_search_index(apps, schema_editor):
+    """Восстанавливает поиск после миграций, пересоздающих таблицу рецептов.
+
+    SQLite меняет таблицу через копию и теряет триггеры поиска. В
+    PostgreSQL колонка и триггер переживают ALTER TABLE, поэтому там
+    ничего не делается.
+    """
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in SQLITE_CREATE:
+            schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    statements = {
+        'postgresql': POSTGRESQL_DROP,
+        'sqlite': SQLITE_DROP,
+    }.get(schema_editor.connection.vendor, ())
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def search_recipes(queryset, query):
+    """Фильтрует рецепты по запросу и аннотирует search_rank."""
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        tsquery = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+        condition = RawSQL(
+            f'{RECIPE_TABLE}.search_vector @@ {tsquery}',
+            (query,),
+            output_field=BooleanField()
+        )
+        rank = RawSQL(
+            f'ts_rank({RECIPE_TABLE}.search_vector, {tsquery})',
+            (query,),
+            output_field=FloatField()
+        )
+    elif vendor == 'sqlite':
+        terms = re.findall(r'\w+', query)
+        if not terms:
+            return queryset
+        match = ' '.join(f'"{term}"*' for term in terms)
+        condition = RawSQL(
+            f'{RECIPE_TABLE}.id IN (SELECT rowid FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s)',
+            (match,),
+            output_field=BooleanField()
+        )
+        rank = RawSQL(
+            f'(SELECT -bm25({SEARCH_TABLE}, 10.0, 1.0) FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s AND rowid = {RECIPE_TABLE}.id)',
+            (match,),
+            output_field=FloatField()
+        )
+    else:
+        condition = Q(name__icontains=query) | Q(text__icontains=query)
+        rank = Value(0.0, output_field=FloatField())
+    return queryset.filter(condition).annotate(
+        search_rank=rank
+    ).order_by('-search_rank', '-id')
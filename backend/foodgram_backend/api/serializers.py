@@ -1,4 +1,8 @@
+from functools import partial
+
+from django.conf import settings
 from django.contrib.auth.hashers import make_password
+from django.db import transaction
 from djoser.serializers import UserSerializer
 from rest_framework import serializers
 from rest_framework.fields import CurrentUserDefault
@@ -6,11 +10,30 @@ from rest_framework.relations import PrimaryKeyRelatedField
 from rest_framework.validators import UniqueValidator
 
 from .fields import CustomImageField
+from .images import get_variant_urls
 from .models import (Favorite, Ingredient, Recipe, RecipeIngredient, RecipeTag,
                      ShoppingCart, Subscription, Tag, User)
+from .representations import forget_recipes
+from .shopping_list import change_recipe_in_shopping_lists, get_recipe_amounts
 from .utils import (LITERALS, MAX_LENGTH_EMAIL, MAX_LENGTH_FIRST_NAME,
                     MAX_LENGTH_LAST_NAME, MAX_LENGTH_PASSWORD,
                     MAX_LENGTH_USERNAME, MIN_COOKING_TIME, validate_username)
+from .viewer import get_viewer
+
+
+class RelationIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.API_MAX_PAGE_SIZE
+    )
+
+
+class PageListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        self.child.prepare_page(items)
+        return super().to_representation(items)
 
 
 class CustomUserSerializer(UserSerializer):
@@ -101,6 +124,7 @@ class UsersSerializer(serializers.ModelSerializer):
             'is_subscribed',
             'avatar'
         )
+        list_serializer_class = PageListSerializer
 
     def create(self, validated_data):
         validated_data['password'] = make_password(
@@ -115,14 +139,16 @@ class UsersSerializer(serializers.ModelSerializer):
             )
         return value
 
+    def prepare_page(self, instances):
+        get_viewer(self.context['request']).scope(
+            Subscription,
+            [instance.id for instance in instances]
+        )
+
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        if user.is_anonymous:
-            return False
-        return Subscription.objects.filter(
-            user=user,
-            subscribed_to=obj
-        ).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return get_viewer(self.context['request']).has(Subscription, obj.id)
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
@@ -193,6 +219,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField(required=False)
     is_in_shopping_cart = serializers.SerializerMethodField(required=False)
     image = CustomImageField(required=True)
+    image_variants = serializers.SerializerMethodField()
     cooking_time = serializers.IntegerField()
 
     class Meta:
@@ -206,21 +233,42 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time'
         )
+        list_serializer_class = PageListSerializer
+
+    @property
+    def _readable_fields(self):
+        # Ингредиенты и теги собираются в to_representation из
+        # предзагруженных промежуточных моделей, объявленные поля пропускаем.
+        for field in super()._readable_fields:
+            if field.field_name not in ('ingredients', 'tags'):
+                yield field
+
+    def prepare_page(self, instances):
+        viewer = get_viewer(self.context['request'])
+        recipe_ids = [instance.id for instance in instances]
+        viewer.scope(Favorite, recipe_ids)
+        viewer.scope(ShoppingCart, recipe_ids)
+        viewer.scope(
+            Subscription,
+            [instance.author_id for instance in instances]
+        )
 
     def get_is_favorited(self, obj):
-        user = self.context['request'].user
-        if user.is_anonymous:
-            return False
-        return Favorite.objects.filter(user=user, recipe=obj).exists()
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        return get_viewer(self.context['request']).has(Favorite, obj.id)
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context['request'].user
-        if user.is_anonymous:
-            return False
-        return ShoppingCart.objects.filter(user=user, recipe=obj).exists()
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        return get_viewer(self.context['request']).has(ShoppingCart, obj.id)
+
+    def get_image_variants(self, obj):
+        return get_variant_urls(obj, self.context.get('request'))
 
     def validate_cooking_time(self, value):
         if value < MIN_COOKING_TIME:
@@ -274,6 +322,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         return data
 
     def to_representation(self, instance):
+        if hasattr(instance, 'is_author_subscribed'):
+            instance.author.is_subscribed = instance.is_author_subscribed
         representation = super().to_representation(instance)
         ingredients_representation = [
             {
@@ -294,24 +344,38 @@ class RecipeSerializer(serializers.ModelSerializer):
             for tag in instance.recipe_tags.all()
         ]
         representation['tags'] = tag_representation
-        return representation
+        return {field: representation[field] for field in self.Meta.fields}
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients', [])
         tags_data = validated_data.pop('tags', [])
         recipe = Recipe.objects.create(**validated_data)
         self.create_or_update(recipe, ingredients_data, tags_data)
+        transaction.on_commit(partial(forget_recipes, [recipe.id]))
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop('ingredients', [])
         tags_data = validated_data.pop('tags', [])
         if ingredients_data:
+            old_amounts = get_recipe_amounts(instance.id)
             RecipeIngredient.objects.filter(recipe=instance).delete()
         if tags_data:
             RecipeTag.objects.filter(recipe=instance).delete()
         instance = super().update(instance, validated_data)
         self.create_or_update(instance, ingredients_data, tags_data)
+        if ingredients_data:
+            change_recipe_in_shopping_lists(
+                instance.id,
+                old_amounts,
+                {
+                    ingredient_data['id'].id: ingredient_data['amount']
+                    for ingredient_data in ingredients_data
+                }
+            )
+        transaction.on_commit(partial(forget_recipes, [instance.id]))
         return instance
 
     def create_or_update(self, recipe, ingredients_data, tags_data):
@@ -335,9 +399,14 @@ class RecipeSerializer(serializers.ModelSerializer):
 
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
+
+    def get_image_variants(self, obj):
+        return get_variant_urls(obj, self.context.get('request'))
 
 
 class SubscribedUserSerializer(serializers.ModelSerializer):
@@ -353,18 +422,16 @@ class SubscribedUserSerializer(serializers.ModelSerializer):
             'last_name',
             'is_subscribed'
         )
+        list_serializer_class = PageListSerializer
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        all_recipes = Recipe.objects.filter(author=instance)
-        representation['recipes_count'] = all_recipes.count()
-        recipes_limit = self.context[
-            'request'
-        ].query_params.get('recipes_limit')
-        if recipes_limit:
-            all_recipes = all_recipes[:int(recipes_limit)]
+        representation['recipes_count'] = instance.recipes_count
+        page_recipes = getattr(self, '_page_recipes', None)
+        if page_recipes is None:
+            page_recipes = self.get_page_recipes([instance.id])
         recipes_representation = ShortRecipeSerializer(
-            all_recipes,
+            page_recipes.get(instance.id, []),
             many=True,
             context=self.context
         ).data
@@ -375,22 +442,43 @@ class SubscribedUserSerializer(serializers.ModelSerializer):
             representation['avatar'] = None
         return representation
 
+    def prepare_page(self, instances):
+        author_ids = [instance.id for instance in instances]
+        get_viewer(self.context['request']).scope(Subscription, author_ids)
+        if 'page_recipes' in self.context:
+            self._page_recipes = self.context['page_recipes']
+        else:
+            self._page_recipes = self.get_page_recipes(author_ids)
+
+    def get_page_recipes(self, author_ids):
+        recipes_limit = self.context[
+            'request'
+        ].query_params.get('recipes_limit', '')
+        recipes = Recipe.objects.first_per_author(
+            author_ids,
+            int(recipes_limit) if recipes_limit.isdigit() else None
+        )
+        page_recipes = {}
+        for recipe in recipes:
+            page_recipes.setdefault(recipe.author_id, []).append(recipe)
+        return page_recipes
+
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        if user.is_anonymous:
-            return False
-        return Subscription.objects.filter(
-            user=user,
-            subscribed_to=obj
-        ).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return get_viewer(self.context['request']).has(Subscription, obj.id)
 
 
 class ShoppingCardSerializer(serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source='recipe.id')
     name = serializers.ReadOnlyField(source='recipe.name')
     image = serializers.ImageField(source='recipe.image', read_only=True)
+    image_variants = serializers.SerializerMethodField()
     cooking_time = serializers.ReadOnlyField(source='recipe.cooking_time')
 
     class Meta:
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
         model = ShoppingCart
+
+    def get_image_variants(self, obj):
+        return get_variant_urls(obj.recipe, self.context.get('request'))
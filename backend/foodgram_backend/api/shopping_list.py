@@ -0,0 +1,190 @@
+import csv
+import json
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import RecipeIngredient, ShoppingCart, ShoppingListItem
+
+ITERATOR_CHUNK_SIZE = 2000
+
+
+def get_recipe_amounts(recipe_id):
+    return dict(
+        RecipeIngredient.objects.filter(recipe_id=recipe_id).values_list(
+            'ingredient_id',
+            'amount'
+        )
+    )
+
+
+def apply_shopping_list_deltas(user_ids, deltas):
+    """Прибавляет deltas {ingredient_id: amount} к итогам пользователей."""
+    deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items() if delta
+    }
+    if not user_ids or not deltas:
+        return
+    ingredients_by_delta = defaultdict(list)
+    for ingredient_id, delta in deltas.items():
+        ingredients_by_delta[delta].append(ingredient_id)
+    with transaction.atomic():
+        ShoppingListItem.objects.bulk_create(
+            [
+                ShoppingListItem(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    amount=0
+                )
+                for user_id in user_ids
+                for ingredient_id, delta in deltas.items() if delta > 0
+            ],
+            ignore_conflicts=True
+        )
+        for delta, ingredient_ids in ingredients_by_delta.items():
+            ShoppingListItem.objects.filter(
+                user_id__in=user_ids,
+                ingredient_id__in=ingredient_ids
+            ).update(amount=F('amount') + delta)
+        ShoppingListItem.objects.filter(
+            user_id__in=user_ids,
+            ingredient_id__in=deltas,
+            amount__lte=0
+        ).delete()
+
+
+def add_to_shopping_list(user_id, recipe_id):
+    apply_shopping_list_deltas([user_id], get_recipe_amounts(recipe_id))
+
+
+def remove_from_shopping_list(user_id, recipe_id):
+    apply_shopping_list_deltas(
+        [user_id],
+        {
+            ingredient_id: -amount
+            for ingredient_id, amount in get_recipe_amounts(recipe_id).items()
+        }
+    )
+
+
+def change_shopping_list(user_id, added, removed):
+    """Пересчитывает итоги пользователя после изменения корзины."""
+    deltas = defaultdict(int)
+    for recipe_id, ingredient_id, amount in RecipeIngredient.objects.filter(
+        recipe_id__in=added | removed
+    ).values_list('recipe_id', 'ingredient_id', 'amount'):
+        deltas[ingredient_id] += amount if recipe_id in added else -amount
+    apply_shopping_list_deltas([user_id], deltas)
+
+
+def change_recipe_in_shopping_lists(recipe_id, old_amounts, new_amounts):
+    deltas = {
+        ingredient_id: (
+            new_amounts.get(ingredient_id, 0)
+            - old_amounts.get(ingredient_id, 0)
+        )
+        for ingredient_id in old_amounts.keys() | new_amounts.keys()
+    }
+    if not any(deltas.values()):
+        return
+    apply_shopping_list_deltas(
+        list(
+            ShoppingCart.objects.filter(recipe_id=recipe_id).values_list(
+                'user_id',
+                flat=True
+            )
+        ),
+        deltas
+    )
+
+
+def get_expected_shopping_lists(user_ids=None):
+    # Один filter(): второй добавил бы еще один JOIN корзин и умножил суммы.
+    if user_ids:
+        expected = RecipeIngredient.objects.filter(
+            recipe__shoppingcart__user__in=user_ids
+        )
+    else:
+        expected = RecipeIngredient.objects.filter(
+            recipe__shoppingcart__isnull=False
+        )
+    return expected.values_list(
+        'recipe__shoppingcart__user',
+        'ingredient'
+    ).annotate(
+        total=Sum('amount')
+    ).order_by(
+        'recipe__shoppingcart__user',
+        'ingredient'
+    ).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+
+
+def get_cart_ingredients(user):
+    return RecipeIngredient.objects.filter(recipe__shoppingcart__user=user)
+
+
+def get_shopping_totals(user):
+    return ShoppingListItem.objects.filter(user=user).order_by(
+        'ingredient__name',
+        'ingredient__measurement_unit'
+    ).values_list(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        'amount'
+    ).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+
+
+def render_txt(user):
+    recipe_ingredients = get_cart_ingredients(user).order_by(
+        'recipe__name',
+        'recipe_id',
+        'ingredient__name'
+    ).values_list(
+        'recipe_id',
+        'recipe__name',
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        'amount'
+    ).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    current_recipe_id = None
+    for recipe_id, recipe_name, name, unit, amount in recipe_ingredients:
+        if recipe_id != current_recipe_id:
+            separator = '' if current_recipe_id is None else '\n'
+            current_recipe_id = recipe_id
+            yield f'{separator}\n{recipe_name}:\n'
+        yield f'  {name} - {amount} {unit}\n'
+    yield '\nShopping List:\n'
+    for name, unit, total in get_shopping_totals(user):
+        yield f'{name} - {total} {unit};\n'
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def render_csv(user):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for row in get_shopping_totals(user):
+        yield writer.writerow(row)
+
+
+def render_json(user):
+    separator = '['
+    for name, unit, total in get_shopping_totals(user):
+        yield separator + json.dumps(
+            {'name': name, 'measurement_unit': unit, 'amount': total},
+            ensure_ascii=False
+        )
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': ('text/plain; charset=utf-8', render_txt),
+    'csv': ('text/csv; charset=utf-8', render_csv),
+    'json': ('application/json', render_json),
+}
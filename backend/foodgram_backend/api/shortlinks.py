@@ -0,0 +1,82 @@
+import hashlib
+import hmac
+import string
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Recipe
+
+ALPHABET = string.digits + string.ascii_letters
+CHECKSUM_LENGTH = 2
+CACHE_PREFIX = 'shortlink:'
+
+
+def encode_base62(number):
+    code = ''
+    while True:
+        number, remainder = divmod(number, len(ALPHABET))
+        code = ALPHABET[remainder] + code
+        if not number:
+            return code
+
+
+def decode_base62(code):
+    number = 0
+    for char in code:
+        number = number * len(ALPHABET) + ALPHABET.index(char)
+    return number
+
+
+def get_checksum(recipe_id):
+    digest = hmac.new(
+        settings.SECRET_KEY.encode(),
+        str(recipe_id).encode(),
+        hashlib.sha256
+    ).digest()
+    return encode_base62(
+        int.from_bytes(digest[:4], 'big')
+    )[-CHECKSUM_LENGTH:].rjust(CHECKSUM_LENGTH, ALPHABET[0])
+
+
+def make_short_code(recipe_id):
+    return encode_base62(recipe_id) + get_checksum(recipe_id)
+
+
+def parse_short_code(code):
+    """Возвращает id рецепта или None, если код поврежден."""
+    if len(code) <= CHECKSUM_LENGTH or any(
+        char not in ALPHABET for char in code
+    ):
+        return None
+    recipe_id = decode_base62(code[:-CHECKSUM_LENGTH])
+    if not hmac.compare_digest(
+        code[-CHECKSUM_LENGTH:],
+        get_checksum(recipe_id)
+    ):
+        return None
+    return recipe_id
+
+
+def recipe_exists(recipe_id):
+    # Кэш у каждого процесса свой, а forget_recipe чистит только текущий,
+    # поэтому отрицательный ответ не кэшируется: иначе другие процессы
+    # отдавали бы 404 на созданный позже рецепт.
+    key = f'{CACHE_PREFIX}{recipe_id}'
+    if cache.get(key):
+        return True
+    exists = Recipe.objects.filter(pk=recipe_id).exists()
+    if exists:
+        cache.set(key, True, settings.SHORT_LINK_CACHE_TIMEOUT)
+    return exists
+
+
+def forget_recipe(recipe_id):
+    cache.delete(f'{CACHE_PREFIX}{recipe_id}')
+
+
+def resolve_short_code(code):
+    recipe_id = parse_short_code(code)
+    if recipe_id is None or not recipe_exists(recipe_id):
+        return None
+    return f'/recipes/{recipe_id}/'
@@ -0,0 +1,201 @@
+from django.core.files.storage import default_storage
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from .cache import response_cache
+from .counters import COUNTERS, change_counter
+from .feed import backfill_feed, clear_feed, fan_out_recipe
+from .images import schedule_variants
+from .indexes import ingredient_index
+from .metrics import record_query
+from .models import (Favorite, Ingredient, Recipe, ShoppingCart, Subscription,
+                     Tag, User)
+from .relations import relations_changed
+from .representations import forget_recipes
+from .shopping_list import (add_to_shopping_list, change_shopping_list,
+                            remove_from_shopping_list)
+from .shortlinks import forget_recipe
+from .versions import (INGREDIENTS_VERSION, TAGS_VERSION, bump_versions,
+                       touch_recipes, viewer_version)
+
+AUTHOR_FIELDS = {'username', 'email', 'first_name', 'last_name', 'avatar'}
+MEDIA_FIELDS = {Recipe: 'image', User: 'avatar'}
+
+
+@receiver(connection_created)
+def track_queries(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def remember_dependent_recipes(sender, instance, **kwargs):
+    lookup = 'recipe_tags__tag' if sender is Tag else 'ingredients'
+    instance.dependent_recipe_ids = list(
+        Recipe.objects.filter(**{lookup: instance}).values_list(
+            'id',
+            flat=True
+        )
+    )
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_catalog_version(sender, instance, **kwargs):
+    bump_versions(TAGS_VERSION if sender is Tag else INGREDIENTS_VERSION)
+    response_cache.invalidate()
+    if hasattr(instance, 'dependent_recipe_ids'):
+        touch_recipes(id__in=instance.dependent_recipe_ids)
+    elif sender is Tag:
+        touch_recipes(recipe_tags__tag=instance)
+    else:
+        touch_recipes(ingredients=instance)
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=Subscription)
+def bump_viewer_version(sender, instance, **kwargs):
+    bump_versions(viewer_version(instance.user_id))
+
+
+def get_author_fields(user):
+    return tuple(
+        field.get_prep_value(field.value_from_object(user))
+        for field in map(User._meta.get_field, sorted(AUTHOR_FIELDS))
+    )
+
+
+@receiver(pre_save, sender=User)
+def remember_author_fields(sender, instance, update_fields=None, **kwargs):
+    instance.previous_author_fields = None
+    if instance.pk is None or (
+        update_fields is not None and not AUTHOR_FIELDS & set(update_fields)
+    ):
+        return
+    instance.previous_author_fields = User.objects.filter(
+        pk=instance.pk
+    ).values_list(*sorted(AUTHOR_FIELDS)).first()
+
+
+@receiver(post_save, sender=User)
+def touch_author_recipes(sender, instance, created, **kwargs):
+    previous = getattr(instance, 'previous_author_fields', None)
+    instance.previous_author_fields = None
+    if created or previous is None or previous == get_author_fields(instance):
+        return
+    touch_recipes(author=instance)
+    forget_recipes(
+        Recipe.objects.filter(author=instance).values_list('id', flat=True)
+    )
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_recipe_to_shopping_list(sender, instance, created, **kwargs):
+    if created:
+        add_to_shopping_list(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_recipe_from_shopping_list(sender, instance, **kwargs):
+    # pre_delete: при каскадном удалении рецепта его ингредиенты ещё на месте.
+    remove_from_shopping_list(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_save, sender=Recipe)
+def add_recipe_to_feeds(sender, instance, created, **kwargs):
+    if created:
+        fan_out_recipe(instance)
+
+
+@receiver(post_save, sender=Subscription)
+def add_author_to_feed(sender, instance, created, **kwargs):
+    if created:
+        backfill_feed(instance.user_id, instance.subscribed_to_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def remove_author_from_feed(sender, instance, **kwargs):
+    clear_feed(instance.user_id, instance.subscribed_to_id)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def forget_short_link(sender, instance, **kwargs):
+    forget_recipe(instance.id)
+
+
+@receiver(post_delete, sender=Recipe)
+def forget_recipe_representation(sender, instance, **kwargs):
+    forget_recipes([instance.id])
+
+
+@receiver(post_save, sender=Recipe)
+def prepare_image_variants(sender, instance, **kwargs):
+    schedule_variants(instance)
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=User)
+def remember_media(sender, instance, update_fields=None, **kwargs):
+    field = MEDIA_FIELDS[sender]
+    if instance.pk is None or (
+        update_fields is not None and field not in update_fields
+    ):
+        return
+    instance.previous_media = sender.objects.filter(
+        pk=instance.pk
+    ).values_list(field, flat=True).first()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def release_replaced_media(sender, instance, **kwargs):
+    previous = getattr(instance, 'previous_media', None)
+    if previous and previous != getattr(instance, MEDIA_FIELDS[sender]).name:
+        default_storage.delete(previous)
+    instance.previous_media = None
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def release_deleted_media(sender, instance, **kwargs):
+    default_storage.delete(getattr(instance, MEDIA_FIELDS[sender]).name)
+
+
+@receiver(relations_changed)
+def apply_relation_changes(sender, user_id, added, removed, **kwargs):
+    bump_versions(viewer_version(user_id))
+    change_counter(sender, added, 1)
+    change_counter(sender, removed, -1)
+    if sender is ShoppingCart:
+        change_shopping_list(user_id, added, removed)
+    elif sender is Subscription:
+        for author_id in added:
+            backfill_feed(user_id, author_id)
+        for author_id in removed:
+            clear_feed(user_id, author_id)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_save, sender=Recipe)
+def increment_counter(sender, instance, created, **kwargs):
+    if created:
+        change_counter(sender, [getattr(instance, COUNTERS[sender][0])], 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_delete, sender=Recipe)
+def decrement_counter(sender, instance, **kwargs):
+    change_counter(sender, [getattr(instance, COUNTERS[sender][0])], -1)
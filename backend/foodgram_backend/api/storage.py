@@ -0,0 +1,64 @@
+import hashlib
+import os
+import posixpath
+from functools import partial
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+
+from .images import get_variant_names
+from .models import Recipe, User
+
+BLOBS_DIR = 'blobs'
+
+
+def is_referenced(name):
+    return (
+        Recipe.objects.filter(image=name).exists()
+        or User.objects.filter(avatar=name).exists()
+    )
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файлы под именем, вычисленным по их содержимому.
+
+    Одинаковые изображения записываются один раз, а имя файла никогда не
+    меняет содержимое, поэтому его можно кешировать бессрочно. Файл
+    удаляется после фиксации транзакции и только если на него к этому
+    моменту не ссылается ни рецепт, ни аватар: откат не оставит в базе
+    ссылку на удаленный файл.
+    """
+
+    # Перезапись безопасна: под тем же именем лежит то же содержимое.
+    OS_OPEN_FLAGS = (
+        os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+    )
+
+    def get_content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(BLOBS_DIR, digest[:2], f'{digest}{extension}')
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        name = self.get_content_name(name, content)
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
+
+    def delete(self, name):
+        if name:
+            transaction.on_commit(partial(self.delete_unreferenced, name))
+
+    def delete_unreferenced(self, name):
+        if is_referenced(name):
+            return
+        super().delete(name)
+        for variant_name in get_variant_names(name):
+            super().delete(variant_name)
@@ -1,6 +1,50 @@
+import json
+import os
+import shutil
+import tempfile
+import warnings
+from datetime import date, datetime, timezone
+from decimal import Decimal
 from http import HTTPStatus
+from io import BytesIO, StringIO
+from unittest import mock
 
-from django.test import Client, TestCase
+import orjson
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.paginator import UnorderedObjectListWarning
+from django.db import DatabaseError, transaction
+from django.test import Client, RequestFactory, TestCase
+from django.utils.translation import gettext_lazy
+from PIL import Image
+from rest_framework import renderers
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ParseError
+from rest_framework.request import Request
+from rest_framework.utils.serializer_helpers import ReturnList
+
+from .cache import (DjangoCacheBackend, LRUBackend, ResponseCache,
+                    response_cache)
+from .counters import reconcile_counters
+from .indexes import ingredient_index
+from .metrics import route_metrics
+from .models import (Favorite, FeedEntry, Ingredient, Recipe, RecipeIngredient,
+                     RecipeTag, ShoppingCart, ShoppingListItem, Subscription,
+                     Tag, User)
+from .pagination import CustomPageNumberPagination
+from .parsers import JSONParser
+from .relations import add_relations
+from .renderers import JSONRenderer, RawJSON
+from .representations import (CACHE_PREFIX, get_recipe_cache,
+                              get_recipe_representations, get_recipe_rows)
+from .search import restore_search_index
+from .serializers import RecipeSerializer
+from .shortlinks import make_short_code, parse_short_code, recipe_exists
+from .viewer import ViewerRelations
 
 
 class APITestCase(TestCase):
@@ -21,3 +65,1828 @@ class APITestCase(TestCase):
         """Проверка доступности списка рецептов."""
         response = self.guest_client.get('/api/recipes/')
         self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+class RecipeQueryCountTestCase(TestCase):
+    RECIPES_COUNT = 12
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author',
+            email='author@example.com'
+        )
+        cls.reader = User.objects.create(
+            username='reader',
+            email='reader@example.com'
+        )
+        cls.token = Token.objects.create(user=cls.reader)
+        tags = Tag.objects.bulk_create(
+            Tag(name=f'tag{index}', slug=f'tag{index}') for index in range(3)
+        )
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'ingredient{index}', measurement_unit='г')
+            for index in range(3)
+        )
+        for index in range(cls.RECIPES_COUNT):
+            recipe = Recipe.objects.create(
+                author=cls.author,
+                name=f'recipe{index}',
+                image='recipe.png',
+                text='text',
+                cooking_time=10
+            )
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient=ingredient,
+                    amount=index + 1
+                )
+                for ingredient in ingredients
+            )
+            RecipeTag.objects.bulk_create(
+                RecipeTag(recipe=recipe, tag=tag) for tag in tags
+            )
+            if index % 2:
+                Favorite.objects.create(user=cls.reader, recipe=recipe)
+                ShoppingCart.objects.create(user=cls.reader, recipe=recipe)
+        Subscription.objects.create(
+            user=cls.reader,
+            subscribed_to=cls.author
+        )
+        cls.recipe = recipe
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.authorized_client = Client(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        )
+        get_recipe_cache().clear()
+
+    def assert_list_query_count(self, client, cold, warm):
+        for limit in (1, 6, self.RECIPES_COUNT):
+            get_recipe_cache().clear()
+            for queries in (cold, warm):
+                with self.assertNumQueries(queries):
+                    response = client.get('/api/recipes/', {'limit': limit})
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertEqual(len(response.json()['results']), limit)
+
+    def test_guest_list_query_count_does_not_depend_on_page_size(self):
+        """Страница для гостя: count и строки, без кэша еще три запроса."""
+        self.assert_list_query_count(self.guest_client, cold=5, warm=2)
+
+    def test_authorized_list_query_count_does_not_depend_on_page_size(self):
+        """Страница рецептов для пользователя: плюс проверка токена."""
+        self.assert_list_query_count(self.authorized_client, cold=6, warm=3)
+
+    def test_authorized_list_flags(self):
+        """Флаги избранного, корзины и подписки берутся из аннотаций."""
+        response = self.authorized_client.get(
+            '/api/recipes/', {'limit': self.RECIPES_COUNT}
+        )
+        results = response.json()['results']
+        favorited = {
+            recipe['name'] for recipe in results if recipe['is_favorited']
+        }
+        in_cart = {
+            recipe['name']
+            for recipe in results if recipe['is_in_shopping_cart']
+        }
+        expected = {
+            f'recipe{index}'
+            for index in range(self.RECIPES_COUNT) if index % 2
+        }
+        self.assertEqual(favorited, expected)
+        self.assertEqual(in_cart, expected)
+        self.assertTrue(
+            all(recipe['author']['is_subscribed'] for recipe in results)
+        )
+        self.assertEqual(len(results[0]['ingredients']), 3)
+        self.assertEqual(len(results[0]['tags']), 3)
+
+    def test_detail_query_count(self):
+        """Детальная страница: версия для ETag и строка рецепта."""
+        url = f'/api/recipes/{self.recipe.id}/'
+        for client, cold, warm in (
+            (self.guest_client, 5, 2),
+            (self.authorized_client, 7, 4),
+        ):
+            get_recipe_cache().clear()
+            for queries in (cold, warm):
+                with self.assertNumQueries(queries):
+                    response = client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response.json()['is_favorited'])
+
+
+class RecipeRepresentationTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author',
+            email='author@example.com',
+            first_name='Имя',
+            last_name='Фамилия',
+            avatar='avatar.png'
+        )
+        other_author = User.objects.create(email='other@example.com')
+        cls.reader = User.objects.create(
+            username='reader',
+            email='reader@example.com'
+        )
+        cls.token = Token.objects.create(user=cls.reader)
+        cls.author_token = Token.objects.create(user=cls.author)
+        tags = Tag.objects.bulk_create(
+            Tag(name=f'tag{index}', slug=f'tag{index}') for index in range(3)
+        )
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'ingredient{index}', measurement_unit='г')
+            for index in range(3)
+        )
+        cls.tags = tags
+        cls.ingredients = ingredients
+        variants = (
+            {},
+            {'source': 'recipe1.png', 'thumbnail': 'variants/recipe1.jpg'},
+            {'source': 'old.png', 'thumbnail': 'variants/old.jpg'},
+        )
+        for index, image_variants in enumerate(variants):
+            recipe = Recipe.objects.create(
+                author=other_author if index == 2 else cls.author,
+                name=f'recipe{index}',
+                image=f'recipe{index}.png',
+                image_variants=image_variants,
+                text='text',
+                cooking_time=index + 1
+            )
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient=ingredient,
+                    amount=index + 1
+                )
+                for ingredient in ingredients[index:]
+            )
+            RecipeTag.objects.bulk_create(
+                RecipeTag(recipe=recipe, tag=tag) for tag in tags[:index + 1]
+            )
+            if index == 0:
+                cls.recipe = recipe
+        Favorite.objects.create(user=cls.reader, recipe=recipe)
+        ShoppingCart.objects.create(user=cls.reader, recipe=recipe)
+        Subscription.objects.create(
+            user=cls.reader,
+            subscribed_to=cls.author
+        )
+
+    def setUp(self):
+        self.reader_client = Client(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        )
+        get_recipe_cache().clear()
+
+    def get_request(self, user):
+        request = Request(RequestFactory().get('/api/recipes/'))
+        request.user = user
+        return request
+
+    def test_rows_match_serializer(self):
+        """Сборка из values_list совпадает с выводом RecipeSerializer."""
+        for user in (AnonymousUser(), self.reader):
+            with self.subTest(user=user):
+                queryset = Recipe.objects.for_viewer(user)
+                expected = RecipeSerializer(
+                    queryset,
+                    many=True,
+                    context={'request': self.get_request(user)}
+                ).data
+                self.assertEqual(
+                    get_recipe_representations(
+                        list(get_recipe_rows(queryset)),
+                        self.get_request(user)
+                    ),
+                    expected
+                )
+
+    def test_list_endpoint_matches_detail(self):
+        """Рецепты в списке и на детальной странице совпадают."""
+        for recipe in self.reader_client.get('/api/recipes/').json():
+            self.assertEqual(
+                self.reader_client.get(f'/api/recipes/{recipe["id"]}/').json(),
+                recipe
+            )
+
+    def test_cached_fragment_has_viewer_flags_overlaid(self):
+        """Общий кэш рецепта не смешивает флаги разных зрителей."""
+        guest = Client().get('/api/recipes/').json()
+        reader = self.reader_client.get('/api/recipes/').json()
+        self.assertFalse(any(recipe['is_favorited'] for recipe in guest))
+        self.assertEqual(
+            [recipe['is_favorited'] for recipe in reader],
+            [True, False, False]
+        )
+        self.assertEqual(
+            [recipe['author']['is_subscribed'] for recipe in reader],
+            [False, True, True]
+        )
+
+    def test_cached_fragment_is_invalidated(self):
+        """Кэш сбрасывается при правке автора, рецепта и удалении."""
+        key = f'{CACHE_PREFIX}{self.recipe.id}'
+        url = f'/api/recipes/{self.recipe.id}/'
+        self.reader_client.get(url)
+        self.assertIsNotNone(get_recipe_cache().get(key))
+        self.author.first_name = 'Другое'
+        self.author.save()
+        self.assertIsNone(get_recipe_cache().get(key))
+        self.assertEqual(
+            self.reader_client.get(url).json()['author']['first_name'],
+            'Другое'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = Client(
+                HTTP_AUTHORIZATION=f'Token {self.author_token.key}'
+            ).patch(
+                url,
+                {
+                    'name': 'Новое название',
+                    'tags': [self.tags[0].id],
+                    'ingredients': [
+                        {'id': self.ingredients[0].id, 'amount': 7}
+                    ],
+                },
+                content_type='application/json'
+            )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIsNone(get_recipe_cache().get(key))
+        recipe = self.reader_client.get(url).json()
+        self.assertEqual(recipe['name'], 'Новое название')
+        self.assertEqual(recipe['ingredients'][0]['amount'], 7)
+        Recipe.objects.filter(pk=self.recipe.id).delete()
+        self.assertIsNone(get_recipe_cache().get(key))
+        self.assertEqual(
+            self.reader_client.get(url).status_code,
+            HTTPStatus.NOT_FOUND
+        )
+
+    def test_unrelated_author_save_keeps_fragments(self):
+        """Правка полей автора, не попадающих в рецепт, не сбрасывает кэш."""
+        key = f'{CACHE_PREFIX}{self.recipe.id}'
+        self.reader_client.get(f'/api/recipes/{self.recipe.id}/')
+        updated = Recipe.objects.get(pk=self.recipe.id).updated
+        author = User.objects.get(pk=self.author.pk)
+        author.is_staff = True
+        author.set_password('new-password')
+        author.save()
+        self.assertIsNotNone(get_recipe_cache().get(key))
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipe.id).updated,
+            updated
+        )
+
+    def test_recipe_is_created_atomically(self):
+        """Рецепт без ингредиентов и тегов не становится виден другим."""
+        count = Recipe.objects.count()
+        with mock.patch.object(
+            RecipeTag.objects,
+            'bulk_create',
+            side_effect=DatabaseError
+        ), self.assertRaises(DatabaseError):
+            RecipeSerializer().create({
+                'author': self.author,
+                'name': 'new',
+                'image': 'new.png',
+                'text': 'text',
+                'cooking_time': 1,
+                'ingredients': [{'id': self.ingredients[0], 'amount': 1}],
+                'tags': [self.tags[0]],
+            })
+        self.assertEqual(Recipe.objects.count(), count)
+
+
+class ViewerRelationsTestCase(TestCase):
+    USERS_COUNT = 8
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create(
+            username='reader',
+            email='reader@example.com'
+        )
+        cls.token = Token.objects.create(user=cls.reader)
+        cls.authors = User.objects.bulk_create(
+            User(username=f'author{index}', email=f'author{index}@example.com')
+            for index in range(cls.USERS_COUNT)
+        )
+        Subscription.objects.bulk_create(
+            Subscription(user=cls.reader, subscribed_to=author)
+            for author in cls.authors[::2]
+        )
+
+    def setUp(self):
+        self.authorized_client = Client(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        )
+
+    def test_users_list_loads_subscriptions_once(self):
+        """Флаг подписки для страницы пользователей: один запрос."""
+        for limit in (2, self.USERS_COUNT + 1):
+            with self.assertNumQueries(4):
+                response = self.authorized_client.get(
+                    '/api/users/', {'limit': limit}
+                )
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+        subscribed = {
+            user['id'] for user in response.json()['results']
+            if user['is_subscribed']
+        }
+        self.assertEqual(
+            subscribed,
+            {author.id for author in self.authors[::2]}
+        )
+
+    def test_viewer_scope_limits_loaded_ids(self):
+        """После scope() загружаются только id текущей страницы."""
+        viewer = ViewerRelations(self.reader)
+        page = [author.id for author in self.authors[:2]]
+        viewer.scope(Subscription, page)
+        with self.assertNumQueries(1):
+            self.assertTrue(viewer.has(Subscription, page[0]))
+            self.assertFalse(viewer.has(Subscription, page[1]))
+        self.assertEqual(viewer._related_ids[Subscription], {page[0]})
+
+
+class SubscriptionsTestCase(TestCase):
+    AUTHORS_COUNT = 6
+    RECIPES_PER_AUTHOR = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create(
+            username='reader',
+            email='reader@example.com'
+        )
+        cls.token = Token.objects.create(user=cls.reader)
+        cls.authors = User.objects.bulk_create(
+            User(username=f'author{index}', email=f'author{index}@example.com')
+            for index in range(cls.AUTHORS_COUNT)
+        )
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=author,
+                name=f'{author.username}-recipe{index}',
+                image='recipe.png',
+                text='text',
+                cooking_time=10
+            )
+            for author in cls.authors
+            for index in range(cls.RECIPES_PER_AUTHOR)
+        )
+        Subscription.objects.bulk_create(
+            Subscription(user=cls.reader, subscribed_to=author)
+            for author in cls.authors
+        )
+        reconcile_counters()
+
+    def setUp(self):
+        self.authorized_client = Client(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        )
+
+    def test_subscriptions_query_count_does_not_depend_on_page_size(self):
+        """Страница подписок: авторы, окно рецептов и флаг подписки."""
+        for limit in (1, self.AUTHORS_COUNT):
+            with self.assertNumQueries(5):
+                response = self.authorized_client.get(
+                    '/api/users/subscriptions/',
+                    {'limit': limit, 'recipes_limit': 2}
+                )
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            self.assertEqual(len(response.json()['results']), limit)
+
+    def test_subscriptions_pages_are_ordered(self):
+        """Страницы подписок идут по id без пропусков и повторов."""
+        ids = []
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', UnorderedObjectListWarning)
+            for page in range(1, self.AUTHORS_COUNT // 2 + 1):
+                response = self.authorized_client.get(
+                    '/api/users/subscriptions/',
+                    {'limit': 2, 'page': page}
+                )
+                ids += [author['id'] for author in response.json()['results']]
+        self.assertEqual(ids, sorted(author.id for author in self.authors))
+
+    def test_subscriptions_recipes_limit(self):
+        """recipes_limit обрезает рецепты, recipes_count считает все."""
+        response = self.authorized_client.get(
+            '/api/users/subscriptions/',
+            {'limit': self.AUTHORS_COUNT, 'recipes_limit': 2}
+        )
+        for author in response.json()['results']:
+            self.assertTrue(author['is_subscribed'])
+            self.assertEqual(author['recipes_count'], self.RECIPES_PER_AUTHOR)
+            self.assertEqual(
+                [recipe['name'] for recipe in author['recipes']],
+                [
+                    f'{author["username"]}-recipe{index}'
+                    for index in reversed(range(2, self.RECIPES_PER_AUTHOR))
+                ]
+            )
+        response = self.authorized_client.get(
+            '/api/users/subscriptions/', {'limit': 1}
+        )
+        self.assertEqual(
+            len(response.json()['results'][0]['recipes']),
+            self.RECIPES_PER_AUTHOR
+        )
+
+
+class PaginationTestCase(TestCase):
+    RECIPES_COUNT = 7
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(
+            username='author',
+            email='author@example.com'
+        )
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=author,
+                name=f'recipe{index}',
+                image='recipe.png',
+                text='text',
+                cooking_time=10
+            )
+            for index in range(cls.RECIPES_COUNT)
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_cursor_mode_walks_all_recipes(self):
+        """Курсорная пагинация проходит все рецепты от новых к старым."""
+        names = []
+        response = self.guest_client.get(
+            '/api/recipes/', {'limit': 3, 'pagination': 'cursor'}
+        )
+        while True:
+            data = response.json()
+            self.assertIsNone(data['count'])
+            names.extend(recipe['name'] for recipe in data['results'])
+            if data['next'] is None:
+                break
+            response = self.guest_client.get(data['next'])
+        self.assertEqual(
+            names,
+            [f'recipe{index}' for index in reversed(range(self.RECIPES_COUNT))]
+        )
+
+    def test_page_mode_without_count(self):
+        """count=none не выполняет COUNT и определяет next по лишней строке."""
+        get_recipe_cache().clear()
+        with self.assertNumQueries(4):
+            response = self.guest_client.get(
+                '/api/recipes/', {'limit': 4, 'count': 'none'}
+            )
+        data = response.json()
+        self.assertIsNone(data['count'])
+        self.assertIsNotNone(data['next'])
+        response = self.guest_client.get(data['next'])
+        data = response.json()
+        self.assertEqual(len(data['results']), self.RECIPES_COUNT - 4)
+        self.assertIsNone(data['next'])
+        self.assertIsNotNone(data['previous'])
+
+    def test_limit_is_capped(self):
+        """Параметр limit ограничен API_MAX_PAGE_SIZE."""
+        request = Request(RequestFactory().get('/', {'limit': 10 ** 6}))
+        self.assertEqual(
+            CustomPageNumberPagination().get_page_size(request),
+            settings.API_MAX_PAGE_SIZE
+        )
+
+
+class IngredientIndexTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('Сахар', 'сахарная пудра', 'ванильный сахар', 'соль')
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        ingredient_index.invalidate()
+
+    def test_prefix_matches_go_before_substring_matches(self):
+        """Поиск без учета регистра: сначала префикс, затем подстрока."""
+        response = self.guest_client.get('/api/ingredients/', {'name': 'сах'})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            [ingredient['name'] for ingredient in response.json()],
+            ['Сахар', 'сахарная пудра', 'ванильный сахар']
+        )
+
+    def test_autocomplete_does_not_query_database_when_warm(self):
+        """Прогретый индекс отвечает без запросов к базе."""
+        ingredient_index.warm()
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(
+                '/api/ingredients/', {'name': 'со'}
+            )
+        self.assertEqual(
+            response.json(),
+            [{
+                'id': Ingredient.objects.get(name='соль').id,
+                'name': 'соль',
+                'measurement_unit': 'г'
+            }]
+        )
+
+    def test_index_is_rebuilt_after_ingredient_change(self):
+        """Изменение ингредиентов сбрасывает индекс."""
+        ingredient_index.warm()
+        Ingredient.objects.create(name='содовая', measurement_unit='мл')
+        response = self.guest_client.get('/api/ingredients/', {'name': 'со'})
+        self.assertEqual(len(response.json()), 2)
+
+
+class RecipeSearchTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author',
+            email='author@example.com'
+        )
+        cls.other_author = User.objects.create(
+            username='other',
+            email='other@example.com'
+        )
+        cls.breakfast = Tag.objects.create(name='Завтрак', slug='breakfast')
+        recipes = {
+            'Блины на молоке': 'Тонкие блины к чаю.',
+            'Сырники': 'Подавать с блинами и сметаной.',
+            'Борщ': 'Классический борщ со сметаной.',
+        }
+        for name, text in recipes.items():
+            recipe = Recipe.objects.create(
+                author=cls.author,
+                name=name,
+                image='recipe.png',
+                text=text,
+                cooking_time=10
+            )
+            RecipeTag.objects.create(recipe=recipe, tag=cls.breakfast)
+        Recipe.objects.create(
+            author=cls.other_author,
+            name='Блины с икрой',
+            image='recipe.png',
+            text='Праздничные блины.',
+            cooking_time=10
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def search(self, **params):
+        response = self.guest_client.get('/api/recipes/', params)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return [recipe['name'] for recipe in response.json()]
+
+    def test_search_ranks_name_matches_first(self):
+        """Совпадения в названии выше совпадений в описании."""
+        names = self.search(search='блин')
+        self.assertEqual(len(names), 3)
+        self.assertEqual(names[-1], 'Сырники')
+
+    def test_search_combines_with_filters(self):
+        """Поиск сочетается с фильтрами по тегам и автору."""
+        self.assertEqual(
+            self.search(search='блины', tags='breakfast'),
+            ['Блины на молоке']
+        )
+        self.assertEqual(
+            self.search(search='блины', author=self.other_author.id),
+            ['Блины с икрой']
+        )
+
+    def test_search_index_follows_updates(self):
+        """Индекс обновляется при изменении и удалении рецептов."""
+        Recipe.objects.filter(name='Борщ').update(
+            name='Солянка',
+            text='Сборная солянка.'
+        )
+        self.assertEqual(self.search(search='борщ'), [])
+        self.assertEqual(self.search(search='солянка'), ['Солянка'])
+        Recipe.objects.filter(name='Солянка').delete()
+        self.assertEqual(self.search(search='солянка'), [])
+
+    def test_restore_runs_only_on_sqlite(self):
+        """Восстановление поиска не переписывает таблицу в PostgreSQL."""
+        for vendor, executed in (('postgresql', False), ('sqlite', True)):
+            schema_editor = mock.Mock()
+            schema_editor.connection.vendor = vendor
+            restore_search_index(None, schema_editor)
+            self.assertEqual(schema_editor.execute.called, executed)
+
+
+class ShoppingListDownloadTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='buyer',
+            email='buyer@example.com'
+        )
+        cls.token = Token.objects.create(user=cls.user)
+        flour = Ingredient.objects.create(name='мука', measurement_unit='г')
+        flour_cups = Ingredient.objects.create(
+            name='мука',
+            measurement_unit='стакан'
+        )
+        milk = Ingredient.objects.create(name='молоко', measurement_unit='мл')
+        amounts = (
+            ('Блины', ((flour, 200), (milk, 500))),
+            ('Оладьи', ((flour, 300), (flour_cups, 1), (milk, 250))),
+        )
+        for name, ingredients in amounts:
+            recipe = Recipe.objects.create(
+                author=cls.user,
+                name=name,
+                image='recipe.png',
+                text='text',
+                cooking_time=10
+            )
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient=ingredient,
+                    amount=amount
+                )
+                for ingredient, amount in ingredients
+            )
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        self.authorized_client = Client(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        )
+
+    def download(self, **params):
+        response = self.authorized_client.get(
+            '/api/recipes/download_shopping_cart/', params
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return b''.join(response.streaming_content).decode()
+
+    def test_txt_totals_are_grouped_by_name_and_unit(self):
+        """Итоги суммируются по названию и единице измерения."""
+        content = self.download()
+        self.assertEqual(
+            content.split('\nShopping List:\n')[1],
+            'молоко - 750 мл;\nмука - 500 г;\nмука - 1 стакан;\n'
+        )
+        self.assertIn('\nБлины:\n  молоко - 500 мл\n  мука - 200 г\n', content)
+
+    def test_csv_and_json_formats(self):
+        """Список покупок доступен в форматах csv и json."""
+        self.assertEqual(
+            self.download(file_format='csv').splitlines(),
+            [
+                'name,measurement_unit,amount',
+                'молоко,мл,750',
+                'мука,г,500',
+                'мука,стакан,1',
+            ]
+        )
+        self.assertEqual(
+            json.loads(self.download(file_format='json')),
+            [
+                {'name': 'молоко', 'measurement_unit': 'мл', 'amount': 750},
+                {'name': 'мука', 'measurement_unit': 'г', 'amount': 500},
+                {'name': 'мука', 'measurement_unit': 'стакан', 'amount': 1},
+            ]
+        )
+
+    def test_unknown_format(self):
+        """Неизвестный формат файла отклоняется."""
+        response = self.authorized_client.get(
+            '/api/recipes/download_shopping_cart/', {'file_format': 'pdf'}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+
+class ShoppingListTotalsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author',
+            email='author@example.com'
+        )
+        cls.author_token = Token.objects.create(user=cls.author)
+        cls.buyer = User.objects.create(
+            username='buyer',
+            email='buyer@example.com'
+        )
+        cls.buyer_token = Token.objects.create(user=cls.buyer)
+        cls.tag = Tag.objects.create(name='Обед', slug='lunch')
+        cls.flour = Ingredient.objects.create(
+            name='мука',
+            measurement_unit='г'
+        )
+        cls.milk = Ingredient.objects.create(
+            name='молоко',
+            measurement_unit='мл'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author,
+            name='Блины',
+            image='recipe.png',
+            text='text',
+            cooking_time=10
+        )
+        RecipeIngredient.objects.bulk_create((
+            RecipeIngredient(recipe=cls.recipe, ingredient=cls.flour,
+                             amount=200),
+            RecipeIngredient(recipe=cls.recipe, ingredient=cls.milk,
+                             amount=500),
+        ))
+
+    def setUp(self):
+        self.buyer_client = Client(
+            HTTP_AUTHORIZATION=f'Token {self.buyer_token.key}'
+        )
+        self.author_client = Client(
+            HTTP_AUTHORIZATION=f'Token {self.author_token.key}'
+        )
+
+    def get_totals(self):
+        return dict(
+            ShoppingListItem.objects.filter(user=self.buyer).values_list(
+                'ingredient__name', 'amount'
+            )
+        )
+
+    def test_totals_follow_cart_and_recipe_changes(self):
+        """Итоги обновляются при изменении корзины и состава рецепта."""
+        url = f'/api/recipes/{self.recipe.id}/shopping_cart/'
+        response = self.buyer_client.post(url)
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertEqual(self.get_totals(), {'мука': 200, 'молоко': 500})
+        response = self.author_client.patch(
+            f'/api/recipes/{self.recipe.id}/',
+            {
+                'ingredients': [{'id': self.flour.id, 'amount': 300}],
+                'tags': [self.tag.id],
+            },
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(self.get_totals(), {'мука': 300})
+        response = self.buyer_client.delete(url)
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        self.assertEqual(self.get_totals(), {})
+
+    def test_recipe_deletion_updates_totals(self):
+        """Удаление рецепта из чужой корзины вычитает его из итогов."""
+        ShoppingCart.objects.create(user=self.buyer, recipe=self.recipe)
+        self.recipe.delete()
+        self.assertEqual(self.get_totals(), {})
+
+    def test_rebuild_command_repairs_drift(self):
+        """Команда rebuild_shopping_lists находит и исправляет расхождения."""
+        ShoppingCart.objects.create(user=self.buyer, recipe=self.recipe)
+        ShoppingListItem.objects.filter(ingredient=self.milk).update(amount=1)
+        output = StringIO()
+        call_command('rebuild_shopping_lists', '--verify', stdout=output)
+        self.assertIn(str(self.buyer.id), output.getvalue())
+        self.assertEqual(self.get_totals()['молоко'], 1)
+        call_command('rebuild_shopping_lists', stdout=StringIO())
+        self.assertEqual(self.get_totals(), {'мука': 200, 'молоко': 500})
+
+    def test_rebuild_for_user_ignores_other_carts(self):
+        """--user не умножает итоги на чужие корзины с тем же рецептом."""
+        ShoppingCart.objects.create(user=self.buyer, recipe=self.recipe)
+        ShoppingCart.objects.create(user=self.author, recipe=self.recipe)
+        output = StringIO()
+        call_command(
+            'rebuild_shopping_lists', '--user', str(self.buyer.id),
+            stdout=output
+        )
+        self.assertIn('Расхождений нет.', output.getvalue())
+        self.assertEqual(self.get_totals(), {'мука': 200, 'молоко': 500})
+
+
+class ConditionalGetTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author',
+            email='author@example.com'
+        )
+        cls.reader = User.objects.create(
+            username='reader',
+            email='reader@example.com'
+        )
+        cls.token = Token.objects.create(user=cls.reader)
+        cls.tag = Tag.objects.create(name='Ужин', slug='dinner')
+        cls.recipe = Recipe.objects.create(
+            author=cls.author,
+            name='Плов',
+            image='recipe.png',
+            text='text',
+            cooking_time=60
+        )
+        RecipeTag.objects.create(recipe=cls.recipe, tag=cls.tag)
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.authorized_client = Client(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        )
+
+    def test_tags_not_modified(self):
+        """Повторный запрос тегов с If-None-Match получает 304."""
+        response = self.guest_client.get('/api/tags/')
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(
+                '/api/tags/', HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Tag.objects.create(name='Завтрак', slug='breakfast')
+        response = self.guest_client.get(
+            '/api/tags/', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_ingredients_not_modified_without_queries(self):
+        """Версия каталога ингредиентов берется из индекса в памяти."""
+        ingredient_index.invalidate()
+        response = self.guest_client.get('/api/ingredients/')
+        etag = response['ETag']
+        self.assertNotIn('Last-Modified', response)
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(
+                '/api/ingredients/', HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Ingredient.objects.create(name='рис', measurement_unit='г')
+        response = self.guest_client.get(
+            '/api/ingredients/', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def rename_author(self):
+        self.author.first_name = 'Другое'
+        self.author.save(update_fields=['first_name'])
+
+    def test_recipe_etag_follows_recipe_and_catalog_changes(self):
+        """ETag рецепта меняется вместе с рецептом, тегом и автором."""
+        url = f'/api/recipes/{self.recipe.id}/'
+        etag = self.guest_client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        changes = (
+            lambda: self.tag.save(),
+            self.rename_author,
+            lambda: self.recipe.save(),
+        )
+        for change in changes:
+            change()
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            etag = response['ETag']
+
+    def test_recipe_with_invalid_id_is_not_found(self):
+        """Нечисловой id рецепта дает 404, а не ошибку сервера."""
+        for client in (self.guest_client, self.authorized_client):
+            response = client.get('/api/recipes/abc/')
+            self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_recipe_etag_depends_on_viewer_relations(self):
+        """ETag рецепта для пользователя зависит от его избранного."""
+        url = f'/api/recipes/{self.recipe.id}/'
+        response = self.authorized_client.get(url)
+        self.assertIn('Authorization', response['Vary'])
+        etag = response['ETag']
+        self.assertNotEqual(etag, self.guest_client.get(url)['ETag'])
+        Favorite.objects.create(user=self.reader, recipe=self.recipe)
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response.json()['is_favorited'])
+
+
+class ResponseCacheTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Tag.objects.create(name='Обед', slug='lunch')
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+
+    def setUp(self):
+        self.guest_client = Client()
+        response_cache.invalidate()
+
+    def test_tags_are_served_from_cache(self):
+        """Повторный список тегов берется из кэша без сериализации."""
+        response = self.guest_client.get('/api/tags/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        with self.assertNumQueries(1):
+            response = self.guest_client.get('/api/tags/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(
+            response.json(),
+            [{'id': Tag.objects.get().id, 'name': 'Обед', 'slug': 'lunch'}]
+        )
+        Tag.objects.create(name='Ужин', slug='dinner')
+        response = self.guest_client.get('/api/tags/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.json()), 2)
+
+    def test_ingredient_prefixes_are_cached_separately(self):
+        """Каждый префикс ингредиентов кэшируется отдельно."""
+        self.guest_client.get('/api/ingredients/', {'name': 'с'})
+        response = self.guest_client.get('/api/ingredients/', {'name': 'со'})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        response = self.guest_client.get('/api/ingredients/', {'name': 'С'})
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_backends(self):
+        """LRU вытесняет старые ключи, общий бэкенд идет через кэш Django."""
+        for backend in (LRUBackend(maxsize=2), DjangoCacheBackend()):
+            cache = ResponseCache(backend)
+            self.assertEqual(
+                cache.get_or_render('a', lambda: b'1'), (b'1', False)
+            )
+            self.assertEqual(
+                cache.get_or_render('a', lambda: b'2'), (b'1', True)
+            )
+            self.assertEqual(cache.stats()['hits'], 1)
+            self.assertEqual(cache.stats()['misses'], 1)
+        lru = LRUBackend(maxsize=2)
+        for key in 'abc':
+            lru.set(key, key.encode())
+        self.assertIsNone(lru.get('a'))
+        self.assertEqual(len(lru), 2)
+
+
+class LoadIngredientsTestCase(TestCase):
+    def load(self, *args):
+        output = StringIO()
+        call_command('load_ingredients', *args, stdout=output)
+        return output.getvalue()
+
+    def test_json_and_csv_are_loaded_idempotently(self):
+        """JSON и CSV загружаются пакетами без дублей."""
+        data_dir = settings.BASE_DIR / 'data'
+        self.load(str(data_dir / 'ingredients.json'), '--batch-size', '500')
+        count = Ingredient.objects.count()
+        self.assertGreater(count, 2000)
+        output = self.load(str(data_dir / 'ingredients.csv'))
+        self.assertIn('добавлено: 0', output)
+        self.assertEqual(Ingredient.objects.count(), count)
+
+    def test_dry_run_and_duplicates(self):
+        """--dry-run ничего не пишет, дубли в файле схлопываются."""
+        with tempfile.NamedTemporaryFile(
+            'w', suffix='.csv', encoding='utf-8', delete=False
+        ) as file:
+            file.write('соль,г\nсоль,г\nсахар,г\nбитая строка\n')
+        self.addCleanup(os.remove, file.name)
+        output = self.load(file.name, '--dry-run', '--batch-size', '2')
+        self.assertIn('будет добавлено: 2, пропущено: 1', output)
+        self.assertFalse(Ingredient.objects.exists())
+        self.load(file.name)
+        self.assertEqual(Ingredient.objects.count(), 2)
+
+
+class FeedTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create(
+            username='reader',
+            email='reader@example.com'
+        )
+        cls.token = Token.objects.create(user=cls.reader)
+        cls.author, cls.popular, cls.stranger = (
+            User.objects.create(
+                username=username,
+                email=f'{username}@example.com'
+            )
+            for username in ('author', 'popular', 'stranger')
+        )
+        for user in (cls.reader, cls.stranger):
+            Subscription.objects.create(user=user, subscribed_to=cls.popular)
+
+    def setUp(self):
+        self.authorized_client = Client(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        )
+
+    def create_recipe(self, author, name):
+        return Recipe.objects.create(
+            author=author,
+            name=name,
+            image='recipe.png',
+            text='text',
+            cooking_time=10
+        )
+
+    def get_feed_names(self):
+        response = self.authorized_client.get(
+            '/api/recipes/feed/', {'limit': 10}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return [recipe['name'] for recipe in response.json()['results']]
+
+    def test_feed_merges_fanned_out_and_popular_authors(self):
+        """Лента: разложенные рецепты и рецепты популярных авторов."""
+        old = self.create_recipe(self.author, 'old')
+        Subscription.objects.create(
+            user=self.reader,
+            subscribed_to=self.author
+        )
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.reader, recipe=old).exists()
+        )
+        with self.settings(FEED_FANOUT_LIMIT=1):
+            popular = self.create_recipe(self.popular, 'popular')
+        self.create_recipe(self.stranger, 'stranger')
+        self.create_recipe(self.author, 'new')
+        self.assertFalse(FeedEntry.objects.filter(recipe=popular).exists())
+        self.assertEqual(self.get_feed_names(), ['new', 'popular', 'old'])
+        Subscription.objects.filter(subscribed_to=self.author).delete()
+        self.assertEqual(self.get_feed_names(), ['popular'])
+
+    def test_feed_is_capped_and_timeline_trimmed(self):
+        """Лента ограничена FEED_SIZE, старые записи ленты удаляются."""
+        Subscription.objects.create(
+            user=self.reader,
+            subscribed_to=self.author
+        )
+        for name in ('first', 'second', 'third'):
+            self.create_recipe(self.author, name)
+        with self.settings(FEED_FANOUT_LIMIT=1):
+            self.create_recipe(self.popular, 'popular')
+        with self.settings(FEED_SIZE=2):
+            self.assertEqual(self.get_feed_names(), ['popular', 'third'])
+        self.assertEqual(
+            list(FeedEntry.objects.filter(user=self.reader).values_list(
+                'recipe__name', flat=True
+            ).order_by('-created')),
+            ['third', 'second']
+        )
+
+    def test_feed_requires_authentication(self):
+        """Лента недоступна анонимному пользователю."""
+        response = Client().get('/api/recipes/feed/')
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+
+
+class ShortLinkTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(
+            username='author',
+            email='author@example.com'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=author,
+            name='recipe',
+            image='recipe.png',
+            text='text',
+            cooking_time=10
+        )
+
+    def test_short_code_round_trip(self):
+        """Код раскодируется обратно, испорченный код отвергается."""
+        for recipe_id in (0, 1, 61, 62, 10 ** 9):
+            code = make_short_code(recipe_id)
+            self.assertEqual(parse_short_code(code), recipe_id)
+        code = make_short_code(self.recipe.id)
+        self.assertIsNone(parse_short_code(code[:-1] + '!'))
+        self.assertIsNone(parse_short_code('1' + code))
+
+    def test_get_link_and_redirect(self):
+        """get-link отдает локальную ссылку, /s/ ведет на рецепт."""
+        client = Client()
+        response = client.get(f'/api/recipes/{self.recipe.id}/get-link/')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        link = response.json()['short-link']
+        code = make_short_code(self.recipe.id)
+        self.assertTrue(link.endswith(f'/s/{code}/'))
+        with self.assertNumQueries(0):
+            response = client.get(f'/s/{code}/')
+        self.assertRedirects(
+            response,
+            f'/recipes/{self.recipe.id}/',
+            fetch_redirect_response=False
+        )
+        self.recipe.delete()
+        self.assertEqual(
+            client.get(f'/s/{code}/').status_code,
+            HTTPStatus.NOT_FOUND
+        )
+        self.assertEqual(
+            client.get('/api/recipes/0/get-link/').status_code,
+            HTTPStatus.NOT_FOUND
+        )
+
+    def test_missing_recipe_is_not_cached(self):
+        """Рецепт, созданный после проверки его id, сразу доступен."""
+        recipe_id = self.recipe.id + 100
+        self.assertFalse(recipe_exists(recipe_id))
+        # bulk_create не вызывает сигналы, как запись в другом процессе.
+        Recipe.objects.bulk_create([Recipe(
+            id=recipe_id,
+            author=self.recipe.author,
+            name='later',
+            image='recipe.png',
+            text='text',
+            cooking_time=10
+        )])
+        self.assertTrue(recipe_exists(recipe_id))
+
+
+class ImageVariantsTestCase(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = self.settings(
+            MEDIA_ROOT=media_root,
+            IMAGE_VARIANT_WORKERS=0
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.author = User.objects.create(
+            username='author',
+            email='author@example.com'
+        )
+
+    def create_recipe(self, content=None):
+        if content is None:
+            image = BytesIO()
+            Image.new('RGB', (2000, 1000), 'red').save(image, 'PNG')
+            content = image.getvalue()
+        with self.captureOnCommitCallbacks(execute=True):
+            return Recipe.objects.create(
+                author=self.author,
+                name='recipe',
+                image=SimpleUploadedFile('recipe.png', content),
+                text='text',
+                cooking_time=10
+            )
+
+    def test_variants_are_generated_after_commit(self):
+        """После сохранения появляются уменьшенные копии изображения."""
+        recipe = self.create_recipe()
+        recipe.refresh_from_db()
+        for variant, size in settings.IMAGE_VARIANTS.items():
+            path = os.path.join(
+                settings.MEDIA_ROOT,
+                recipe.image_variants[variant]
+            )
+            with Image.open(path) as image:
+                self.assertEqual(image.size, (size[0], size[0] // 2))
+        response = Client().get(f'/api/recipes/{recipe.id}/')
+        variants = response.json()['image_variants']
+        self.assertEqual(set(variants), set(settings.IMAGE_VARIANTS))
+        self.assertTrue(variants['card'].endswith(
+            recipe.image_variants['card']
+        ))
+
+    def test_broken_image_is_logged_inline(self):
+        """Ошибка обработки изображения не прерывает сохранение рецепта."""
+        content = BytesIO()
+        Image.new('RGB', (2000, 1000), 'red').save(content, 'PNG')
+        with self.assertLogs('api.images', 'ERROR'):
+            recipe = self.create_recipe(content.getvalue()[:200])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_variants, {})
+
+    def test_original_is_served_until_variants_are_ready(self):
+        """Пока копий нет, вместо них отдается оригинал."""
+        with self.settings(IMAGE_VARIANTS_ENABLED=False):
+            recipe = self.create_recipe()
+        response = Client().get(f'/api/recipes/{recipe.id}/')
+        body = response.json()
+        self.assertEqual(
+            set(body['image_variants'].values()),
+            {body['image']}
+        )
+
+
+class ContentAddressedStorageTestCase(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = self.settings(
+            MEDIA_ROOT=media_root,
+            IMAGE_VARIANTS_ENABLED=False
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.author = User.objects.create(
+            username='author',
+            email='author@example.com'
+        )
+
+    def create_recipe(self, name, content):
+        return Recipe.objects.create(
+            author=self.author,
+            name=name,
+            image=SimpleUploadedFile('temp.png', content),
+            text='text',
+            cooking_time=10
+        )
+
+    def test_identical_images_share_one_blob(self):
+        """Одинаковые файлы хранятся один раз и удаляются последними."""
+        first = self.create_recipe('first', b'image')
+        second = self.create_recipe('second', b'image')
+        other = self.create_recipe('other', b'other image')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, other.image.name)
+        self.assertTrue(first.image.name.startswith('blobs/'))
+        self.author.avatar.save(
+            'author.png', ContentFile(b'image'), save=True
+        )
+        self.assertEqual(self.author.avatar.name, first.image.name)
+        path = first.image.path
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+            second.delete()
+        self.assertTrue(os.path.exists(path))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.avatar.delete(save=True)
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(os.path.exists(other.image.path))
+
+    def test_rolled_back_delete_keeps_blob(self):
+        """Файл не удаляется, если транзакция удаления откатилась."""
+        recipe = self.create_recipe('recipe', b'image')
+        path = recipe.image.path
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    Recipe.objects.filter(pk=recipe.pk).delete()
+                    raise DatabaseError
+            except DatabaseError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertTrue(os.path.exists(path))
+        self.assertTrue(Recipe.objects.filter(pk=recipe.pk).exists())
+
+
+class RecipeExportImportTestCase(TestCase):
+    def setUp(self):
+        author = User.objects.create(
+            username='author',
+            email='author@example.com'
+        )
+        tags = Tag.objects.bulk_create(
+            Tag(name=f'tag{index}', slug=f'tag{index}') for index in range(2)
+        )
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'ingredient{index}', measurement_unit='г')
+            for index in range(2)
+        )
+        for index in range(3):
+            recipe = Recipe.objects.create(
+                author=author,
+                name=f'recipe{index}',
+                image=f'recipe{index}.png',
+                text='text',
+                cooking_time=10 + index
+            )
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient=ingredient,
+                    amount=index + 1
+                )
+                for ingredient in ingredients
+            )
+            RecipeTag.objects.bulk_create(
+                RecipeTag(recipe=recipe, tag=tag) for tag in tags[:index]
+            )
+
+    def snapshot(self):
+        return [
+            (
+                recipe.author.email,
+                recipe.name,
+                recipe.image.name,
+                recipe.cooking_time,
+                sorted(
+                    (item.ingredient.name, item.amount)
+                    for item in recipe.recipe_ingredients.all()
+                ),
+                sorted(item.tag.slug for item in recipe.recipe_tags.all())
+            )
+            for recipe in Recipe.objects.with_related().order_by('name')
+        ]
+
+    def test_export_and_import_round_trip(self):
+        """Выгруженные рецепты загружаются обратно без потерь."""
+        expected = self.snapshot()
+        with tempfile.NamedTemporaryFile(suffix='.ndjson') as file:
+            call_command('export_recipes', file.name, stderr=StringIO())
+            User.objects.all().delete()
+            Tag.objects.all().delete()
+            Ingredient.objects.filter(name='ingredient1').delete()
+            output = StringIO()
+            call_command(
+                'import_recipes', file.name, '--batch-size', '2',
+                stdout=output
+            )
+        self.assertIn('Рецептов: 3, пропущено: 0', output.getvalue())
+        self.assertEqual(self.snapshot(), expected)
+
+    def test_import_reports_bad_records(self):
+        """Неполные записи и конфликт авторов пропускаются с номером строки."""
+        good = {
+            'name': 'new',
+            'text': 'text',
+            'cooking_time': 5,
+            'author': {'email': 'new@example.com', 'username': 'new'},
+            'ingredients': [
+                {'name': 'соль', 'measurement_unit': 'г', 'amount': 1}
+            ],
+        }
+        records = (
+            good,
+            {**good, 'author': {'username': 'no-email'}},
+            {**good, 'ingredients': [{'measurement_unit': 'г', 'amount': 1}]},
+            {**good, 'author': {'email': 'other@example.com',
+                                'username': 'author'}},
+        )
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson') as file:
+            file.write('\n'.join(json.dumps(record) for record in records))
+            file.write('\n{broken\n')
+            file.flush()
+            output, errors = StringIO(), StringIO()
+            call_command(
+                'import_recipes', file.name, stdout=output, stderr=errors
+            )
+        self.assertIn('Рецептов: 1, пропущено: 4', output.getvalue())
+        errors = errors.getvalue()
+        for number, reason in (
+            (2, 'автор: нет поля email'),
+            (3, 'ингредиент: нет поля name'),
+            (4, 'автор other@example.com не создан'),
+            (5, 'некорректный JSON'),
+        ):
+            self.assertIn(f'Строка {number} пропущена: {reason}', errors)
+        self.assertIn('имя пользователя author уже занято', errors)
+        self.assertTrue(Recipe.objects.filter(name='new').exists())
+
+
+class RelationBatchTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create(
+            username='reader',
+            email='reader@example.com'
+        )
+        cls.token = Token.objects.create(user=cls.reader)
+        cls.author = User.objects.create(
+            username='author',
+            email='author@example.com'
+        )
+        ingredient = Ingredient.objects.create(
+            name='соль',
+            measurement_unit='г'
+        )
+        cls.recipes = []
+        for index in range(2):
+            recipe = Recipe.objects.create(
+                author=cls.author,
+                name=f'recipe{index}',
+                image='recipe.png',
+                text='text',
+                cooking_time=10
+            )
+            RecipeIngredient.objects.create(
+                recipe=recipe,
+                ingredient=ingredient,
+                amount=index + 1
+            )
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        self.authorized_client = Client(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        )
+
+    def send(self, method, url, ids):
+        response = getattr(self.authorized_client, method)(
+            url,
+            json.dumps({'ids': ids}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return [item['status'] for item in response.json()['results']]
+
+    def test_cart_batch_reports_per_item_results(self):
+        """Пакетная корзина: статус по каждому id и итоги списка."""
+        url = '/api/recipes/shopping_cart/batch/'
+        ids = [recipe.id for recipe in self.recipes]
+        self.assertEqual(
+            self.send('post', url, [ids[0], ids[0], 10 ** 9]),
+            ['added', 'not_found']
+        )
+        self.assertEqual(
+            self.send('post', url, ids),
+            ['exists', 'added']
+        )
+        self.assertEqual(
+            list(self.reader.shopping_list_items.values_list(
+                'amount', flat=True
+            )),
+            [3]
+        )
+        self.assertEqual(
+            self.send('delete', url, [ids[1], 10 ** 9]),
+            ['removed', 'not_found']
+        )
+        self.assertEqual(
+            list(self.reader.shopping_list_items.values_list(
+                'amount', flat=True
+            )),
+            [1]
+        )
+
+    def test_subscribe_batch_fills_feed(self):
+        """Пакетная подписка раскладывает рецепты автора в ленту."""
+        url = '/api/users/subscribe/batch/'
+        self.assertEqual(self.send('post', url, [self.author.id]), ['added'])
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(),
+            len(self.recipes)
+        )
+        self.assertEqual(
+            self.send('delete', url, [self.author.id]),
+            ['removed']
+        )
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+
+    def test_single_favorite_toggle(self):
+        """Одиночное избранное не падает при повторном запросе."""
+        url = f'/api/recipes/{self.recipes[0].id}/favorite/'
+        response = self.authorized_client.post(url)
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertEqual(response.json()['name'], 'recipe0')
+        response = self.authorized_client.post(url)
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        response = self.authorized_client.delete(url)
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        response = self.authorized_client.delete(url)
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertFalse(Favorite.objects.exists())
+
+    def test_single_actions_with_invalid_id_are_not_found(self):
+        """Нечисловой id в одиночных действиях дает 404."""
+        for url in (
+            '/api/recipes/abc/favorite/',
+            '/api/recipes/abc/shopping_cart/',
+            '/api/users/abc/subscribe/',
+        ):
+            response = self.authorized_client.post(url)
+            self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class CountersTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create(
+            username='reader',
+            email='reader@example.com'
+        )
+        cls.token = Token.objects.create(user=cls.reader)
+        cls.author = User.objects.create(
+            username='author',
+            email='author@example.com'
+        )
+
+    def setUp(self):
+        self.authorized_client = Client(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        )
+
+    def create_recipe(self, name):
+        return Recipe.objects.create(
+            author=self.author,
+            name=name,
+            image='recipe.png',
+            text='text',
+            cooking_time=10
+        )
+
+    def test_counters_follow_relations(self):
+        """Счетчики меняются вместе со связями и рецептами."""
+        first, second = self.create_recipe('first'), self.create_recipe('2')
+        self.authorized_client.post(f'/api/recipes/{first.id}/favorite/')
+        self.authorized_client.post(
+            '/api/recipes/shopping_cart/batch/',
+            json.dumps({'ids': [first.id, second.id]}),
+            content_type='application/json'
+        )
+        self.authorized_client.post(f'/api/users/{self.author.id}/subscribe/')
+        Favorite.objects.create(user=self.author, recipe=first)
+        first.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual((first.favorites_count, first.in_carts_count), (2, 1))
+        self.assertEqual(
+            (self.author.recipes_count, self.author.subscribers_count),
+            (2, 1)
+        )
+        self.authorized_client.delete(f'/api/recipes/{first.id}/favorite/')
+        second.delete()
+        first.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(first.favorites_count, 1)
+        self.assertEqual(self.author.recipes_count, 1)
+
+    def test_stale_save_keeps_counters(self):
+        """Сохранение устаревшей модели не откатывает счетчики."""
+        recipe = self.create_recipe('recipe')
+        stale_recipe = Recipe.objects.get(pk=recipe.pk)
+        stale_author = User.objects.get(pk=self.author.pk)
+        add_relations(Favorite, self.reader.id, [recipe.id])
+        add_relations(Subscription, self.reader.id, [self.author.id])
+        stale_recipe.name = 'new name'
+        stale_recipe.save()
+        stale_author.first_name = 'Имя'
+        stale_author.save()
+        recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(
+            (recipe.name, recipe.favorites_count),
+            ('new name', 1)
+        )
+        self.assertEqual(
+            (self.author.first_name, self.author.subscribers_count),
+            ('Имя', 1)
+        )
+
+    def test_reconcile_fixes_drift(self):
+        """reconcile_counters исправляет разошедшиеся счетчики."""
+        recipe = self.create_recipe('recipe')
+        Favorite.objects.create(user=self.reader, recipe=recipe)
+        Recipe.objects.update(favorites_count=5)
+        User.objects.update(recipes_count=0)
+        output = StringIO()
+        call_command('reconcile_counters', '--verify', stdout=output)
+        self.assertIn('Всего найдено: 2', output.getvalue())
+        call_command('reconcile_counters', stdout=StringIO())
+        recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(self.author.recipes_count, 1)
+        self.assertEqual(reconcile_counters(dry_run=True)['recipes_count'], 0)
+
+
+class MetricsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(
+            username='admin',
+            email='admin@example.com',
+            is_staff=True
+        )
+        cls.token = Token.objects.create(user=cls.admin)
+        Recipe.objects.create(
+            author=cls.admin,
+            name='recipe',
+            image='recipe.png',
+            text='text',
+            cooking_time=10
+        )
+
+    def setUp(self):
+        route_metrics.reset()
+
+    def test_server_timing_and_route_histograms(self):
+        """Server-Timing в ответе и гистограммы по маршрутам."""
+        get_recipe_cache().clear()
+        for _ in range(2):
+            response = Client().get('/api/recipes/', {'limit': 5})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        timing = response['Server-Timing']
+        for name in ('db;desc="2 queries"', 'view;', 'render;', 'total;'):
+            self.assertIn(name, timing)
+        response = Client(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        ).get('/api/_metrics/')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        route = response.json()['routes']['RecipeViewSet.list']
+        self.assertEqual(route['latency_ms']['count'], 2)
+        self.assertEqual(route['queries']['sum'], 7)
+        self.assertIn('hits', response.json()['response_cache'])
+
+    def test_metrics_are_staff_only(self):
+        """Метрики недоступны обычным пользователям."""
+        self.assertEqual(
+            Client().get('/api/_metrics/').status_code,
+            HTTPStatus.UNAUTHORIZED
+        )
+
+
+class AsyncViewsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create(
+            username='reader',
+            email='reader@example.com'
+        )
+        cls.token = Token.objects.create(user=cls.reader)
+        cls.author = User.objects.create(
+            username='author',
+            email='author@example.com'
+        )
+        tag = Tag.objects.create(name='обед', slug='lunch')
+        ingredient = Ingredient.objects.create(
+            name='соль',
+            measurement_unit='г'
+        )
+        cls.recipes = []
+        for index in range(3):
+            recipe = Recipe.objects.create(
+                author=cls.author,
+                name=f'recipe{index}',
+                image='recipe.png',
+                text='text',
+                cooking_time=10
+            )
+            RecipeIngredient.objects.create(
+                recipe=recipe,
+                ingredient=ingredient,
+                amount=index + 1
+            )
+            RecipeTag.objects.create(recipe=recipe, tag=tag)
+            cls.recipes.append(recipe)
+        Favorite.objects.create(user=cls.reader, recipe=cls.recipes[0])
+        Subscription.objects.create(user=cls.reader, subscribed_to=cls.author)
+        reconcile_counters()
+
+    def get_headers(self, authorized):
+        if not authorized:
+            return {}
+        return {'authorization': f'Token {self.token.key}'}
+
+    def request(self, method, url, authorized=True, headers=None, **kwargs):
+        async def send():
+            return await getattr(self.async_client, method)(
+                url,
+                headers={**self.get_headers(authorized), **(headers or {})},
+                **kwargs
+            )
+
+        with self.settings(ROOT_URLCONF='foodgram_backend.async_urls'):
+            return async_to_sync(send)()
+
+    def assert_same_as_sync(self, url, data=None, authorized=True):
+        expected = self.client.get(
+            url, data, headers=self.get_headers(authorized)
+        )
+        response = self.request('get', url, authorized, data=data)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.json(), expected.json())
+        return response
+
+    def test_read_endpoints_match_sync_views(self):
+        """Асинхронные списки и карточка отдают то же, что синхронные."""
+        for authorized in (False, True):
+            self.assert_same_as_sync(
+                '/api/recipes/', {'limit': 2}, authorized
+            )
+            self.assert_same_as_sync(
+                '/api/recipes/',
+                {'limit': 2, 'page': 2, 'tags': 'lunch'},
+                authorized
+            )
+            self.assert_same_as_sync(
+                f'/api/recipes/{self.recipes[0].id}/', authorized=authorized
+            )
+        self.assert_same_as_sync(
+            '/api/users/subscriptions/', {'limit': 1, 'recipes_limit': 2}
+        )
+
+    def test_recipe_detail_etag(self):
+        """Карточка рецепта поддерживает If-None-Match."""
+        url = f'/api/recipes/{self.recipes[0].id}/'
+        etag = self.assert_same_as_sync(url)['ETag']
+        response = self.request('get', url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_relation_actions(self):
+        """Избранное и подписка меняются асинхронными действиями."""
+        url = f'/api/recipes/{self.recipes[1].id}/favorite/'
+        response = self.request('post', url)
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertEqual(response.json()['id'], self.recipes[1].id)
+        self.assertEqual(
+            self.request('post', url).status_code,
+            HTTPStatus.BAD_REQUEST
+        )
+        self.recipes[1].refresh_from_db()
+        self.assertEqual(self.recipes[1].favorites_count, 1)
+        response = self.request(
+            'delete', f'/api/users/{self.author.id}/subscribe/'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        self.assertFalse(Subscription.objects.exists())
+
+    def test_other_requests_fall_back_to_sync_views(self):
+        """Запись, ошибки и курсорный режим обрабатывают синхронные views."""
+        self.assertEqual(
+            self.request('post', '/api/recipes/', data={}).status_code,
+            HTTPStatus.BAD_REQUEST
+        )
+        self.assertEqual(
+            self.request(
+                'get', '/api/recipes/', data={'limit': 2, 'page': 9}
+            ).status_code,
+            HTTPStatus.NOT_FOUND
+        )
+        self.assertEqual(
+            self.request(
+                'get', '/api/users/subscriptions/', authorized=False
+            ).status_code,
+            HTTPStatus.UNAUTHORIZED
+        )
+        self.assert_same_as_sync(
+            '/api/recipes/', {'limit': 2, 'pagination': 'cursor'}
+        )
+        self.assertEqual(
+            self.request(
+                'post', f'/api/recipes/{10 ** 9}/shopping_cart/'
+            ).status_code,
+            HTTPStatus.NOT_FOUND
+        )
+
+
+class HealthCheckTestCase(TestCase):
+    def test_liveness_skips_database_and_allowed_hosts(self):
+        """/healthz отвечает без запросов к БД и с любым Host."""
+        with self.assertNumQueries(0):
+            response = Client(HTTP_HOST='10.0.0.1:8000').get('/healthz')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json(), {'status': 'ok'})
+
+    def test_readiness_checks_database(self):
+        """/readyz проверяет БД одним SELECT 1."""
+        with self.assertNumQueries(1):
+            response = Client(HTTP_HOST='10.0.0.1:8000').get('/readyz')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        with mock.patch(
+            'api.middleware.caches',
+            {'default': mock.Mock(get=mock.Mock(side_effect=OSError))}
+        ):
+            response = Client().get('/readyz')
+        self.assertEqual(response.status_code, HTTPStatus.SERVICE_UNAVAILABLE)
+        self.assertEqual(response.json()['failures'], ['cache:default'])
+
+
+class JSONCodecTestCase(TestCase):
+    DATA = {
+        'created': datetime(2024, 6, 1, 12, 30, 15, 250, tzinfo=timezone.utc),
+        'day': date(2024, 6, 1),
+        'amount': Decimal('1.50'),
+        'detail': gettext_lazy('Not found.'),
+        'text': 'строка\u2028с разделителем',
+        'results': ReturnList([{1: 'id-ключ', 'flag': True}], serializer=None),
+        'empty': None,
+    }
+
+    def test_renderer_matches_drf_output(self):
+        """orjson-рендерер выдает те же байты, что и рендерер DRF."""
+        expected = renderers.JSONRenderer().render(self.DATA)
+        self.assertEqual(JSONRenderer().render(self.DATA), expected)
+        with mock.patch('api.renderers.orjson', None):
+            self.assertEqual(JSONRenderer().render(self.DATA), expected)
+        self.assertEqual(
+            JSONRenderer().render(self.DATA, 'application/json; indent=4'),
+            renderers.JSONRenderer().render(
+                self.DATA, 'application/json; indent=4'
+            )
+        )
+        self.assertEqual(JSONRenderer().render(RawJSON(b'[1]')), b'[1]')
+
+    def test_parser(self):
+        """Парсер разбирает UTF-8 и сообщает об ошибке как DRF."""
+        body = json.dumps({'name': 'Плов', 'image': 'A' * 1000}).encode()
+        for fast_json in (orjson, None):
+            with mock.patch('api.parsers.orjson', fast_json):
+                self.assertEqual(
+                    JSONParser().parse(BytesIO(body)),
+                    json.loads(body)
+                )
+                with self.assertRaisesMessage(ParseError, 'JSON parse error'):
+                    JSONParser().parse(BytesIO(b'{"name":'))
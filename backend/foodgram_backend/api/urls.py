@@ -1,7 +1,8 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
+from .views import (IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet,
+                    metrics)
 
 router_v1 = DefaultRouter()
 
@@ -27,6 +28,7 @@ router_v1.register(
 )
 
 urlpatterns = [
+    path('_metrics/', metrics, name='metrics'),
     path('', include(router_v1.urls)),
     path('auth/', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
@@ -0,0 +1,46 @@
+import hashlib
+import uuid
+
+from django.utils import timezone
+
+from .models import ContentVersion, Recipe
+
+TAGS_VERSION = 'tags'
+INGREDIENTS_VERSION = 'ingredients'
+
+
+def viewer_version(user_id):
+    return f'viewer:{user_id}'
+
+
+def bump_versions(*keys):
+    updated = timezone.now()
+    ContentVersion.objects.bulk_create(
+        [
+            ContentVersion(key=key, token=uuid.uuid4().hex, updated=updated)
+            for key in keys
+        ],
+        update_conflicts=True,
+        unique_fields=['key'],
+        update_fields=['token', 'updated']
+    )
+
+
+def get_versions(*keys):
+    return {
+        key: (token, updated)
+        for key, token, updated in ContentVersion.objects.filter(
+            key__in=keys
+        ).values_list('key', 'token', 'updated')
+    }
+
+
+def touch_recipes(**filters):
+    Recipe.objects.filter(**filters).update(updated=timezone.now())
+
+
+def make_etag(*parts):
+    digest = hashlib.sha1(
+        '|'.join(str(part) for part in parts).encode()
+    ).hexdigest()
+    return f'"{digest}"'
@@ -0,0 +1,60 @@
+from .models import Favorite, ShoppingCart, Subscription
+
+RELATED_ID_FIELDS = {
+    Subscription: 'subscribed_to_id',
+    Favorite: 'recipe_id',
+    ShoppingCart: 'recipe_id',
+}
+
+
+class ViewerRelations:
+    """Подписки, избранное и корзина текущего пользователя.
+
+    Каждая связь загружается лениво одним запросом на запрос к API.
+    Если сериализатор списка заранее сообщил id объектов страницы через
+    scope(), загружаются только они, а не вся связь пользователя.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._related_ids = {}
+        self._checked_ids = {}
+        self._complete = set()
+        self._scopes = {}
+
+    def scope(self, model, ids):
+        if self.user.is_anonymous or model in self._complete:
+            return
+        self._scopes.setdefault(model, set()).update(ids)
+
+    def has(self, model, pk):
+        if self.user.is_anonymous:
+            return False
+        if (
+            model not in self._complete
+            and pk not in self._checked_ids.get(model, ())
+        ):
+            self._load(model, pk)
+        return pk in self._related_ids[model]
+
+    def _load(self, model, pk):
+        field = RELATED_ID_FIELDS[model]
+        queryset = model.objects.filter(user=self.user)
+        ids = self._scopes.pop(model, None)
+        if ids is None:
+            self._complete.add(model)
+        else:
+            ids.add(pk)
+            self._checked_ids.setdefault(model, set()).update(ids)
+            queryset = queryset.filter(**{f'{field}__in': ids})
+        self._related_ids.setdefault(model, set()).update(
+            queryset.values_list(field, flat=True)
+        )
+
+
+def get_viewer(request):
+    viewer = getattr(request, '_viewer_relations', None)
+    if viewer is None:
+        viewer = ViewerRelations(request.user)
+        request._viewer_relations = viewer
+    return viewer
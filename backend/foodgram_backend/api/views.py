@@ -1,26 +1,38 @@
 import base64
 
-import pyshorteners
 from django.core.files.base import ContentFile
-from django.http import HttpResponse
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import redirect
+from django.urls import reverse
+from django.utils.cache import patch_vary_headers
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from rest_framework import status, viewsets
-from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework import generics, status, viewsets
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 
+from .cache import response_cache
+from .feed import get_feed
 from .filters import IngredientFilter, RecipeFilter
-from .mixins import ActionMixin
+from .indexes import ingredient_index
+from .metrics import route_metrics
+from .mixins import ActionMixin, CachedResponseMixin, ConditionalGetMixin
 from .models import (Favorite, Ingredient, Recipe, ShoppingCart, Subscription,
                      Tag, User)
 from .pagination import CustomPageNumberPagination
 from .permisions import IsAuthorOrAdmin
+from .renderers import JSONRenderer
+from .representations import get_recipe_representations, get_recipe_rows
 from .serializers import (CustomUserSerializer, IngredientSerializer,
                           PasswordChangeSerializer, RecipeSerializer,
-                          ShoppingCardSerializer, ShortRecipeSerializer,
-                          SubscribedUserSerializer, TagSerializer,
-                          UserCreateResponseSerializer, UsersSerializer)
+                          ShortRecipeSerializer, SubscribedUserSerializer,
+                          TagSerializer, UserCreateResponseSerializer,
+                          UsersSerializer)
+from .shopping_list import SHOPPING_LIST_FORMATS
+from .shortlinks import make_short_code, recipe_exists, resolve_short_code
+from .versions import (INGREDIENTS_VERSION, TAGS_VERSION, get_versions,
+                       make_etag, viewer_version)
 
 
 class CustomUserViewSet(UserViewSet):
@@ -32,6 +44,7 @@ class UserViewSet(viewsets.ModelViewSet, ActionMixin):
     queryset = User.objects.all()
     serializer_class = UsersSerializer
     pagination_class = CustomPageNumberPagination
+    cursor_ordering = ('id',)
     http_method_names = ('get', 'post', 'delete', 'patch', 'put')
 
     def create(self, request, *args, **kwargs):
@@ -49,7 +62,7 @@ class UserViewSet(viewsets.ModelViewSet, ActionMixin):
     )
     def subscriptions(self, request):
         user = request.user
-        queryset = User.objects.filter(subscribers__user=user)
+        queryset = User.objects.filter(subscribers__user=user).order_by('id')
         pages = self.paginate_queryset(queryset)
         serializer = SubscribedUserSerializer(
             pages,
@@ -69,9 +82,18 @@ class UserViewSet(viewsets.ModelViewSet, ActionMixin):
             model=Subscription,
             serializer_class=SubscribedUserSerializer,
             request=request,
-            subscribed_to=self.get_object()
+            instance=generics.get_object_or_404(User, pk=pk)
         )
 
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[IsAuthenticated],
+        url_path='subscribe/batch'
+    )
+    def subscribe_batch(self, request):
+        return self.handle_batch_action(Subscription, request)
+
     @action(
         detail=False,
         methods=['get', 'patch'],
@@ -151,55 +173,160 @@ class UserViewSet(viewsets.ModelViewSet, ActionMixin):
         )
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(
+    CachedResponseMixin,
+    ConditionalGetMixin,
+    viewsets.ModelViewSet
+):
+    version_key = TAGS_VERSION
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    pagination_class = None
     http_method_names = ['get', 'post']
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return self.conditional_response(
+            self.list_cached, request, *args, **kwargs
+        )
+
+    def list_cached(self, request, *args, **kwargs):
+        return self.cached_response(
+            f'tags:{self.etag}',
+            lambda: JSONRenderer().render(
+                self.get_serializer(self.get_queryset(), many=True).data
+            )
+        )
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(
+    CachedResponseMixin,
+    ConditionalGetMixin,
+    viewsets.ModelViewSet
+):
+    version_key = INGREDIENTS_VERSION
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
     http_method_names = ['get']
 
+    def get_conditional_validators(self, request, *args, **kwargs):
+        if self.action != 'list':
+            return super().get_conditional_validators(
+                request, *args, **kwargs
+            )
+        # Без Last-Modified: время сборки индекса свое в каждом процессе.
+        etag = make_etag(self.version_key, ingredient_index.get_version())
+        return etag, None
+
     def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return self.conditional_response(
+            self.list_from_index, request, *args, **kwargs
+        )
+
+    def list_from_index(self, request, *args, **kwargs):
+        name = request.query_params.get('name', '').casefold()
+        return self.cached_response(
+            f'ingredients:{self.etag}:{name}',
+            lambda: b'[' + b','.join(
+                ingredient_index.search(name) if name
+                else ingredient_index.all()
+            ) + b']'
+        )
 
 
-class RecipeViewSet(viewsets.ModelViewSet, ActionMixin):
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet, ActionMixin):
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     pagination_class = CustomPageNumberPagination
+    cursor_ordering = ('-created', '-id')
+    conditional_actions = ('retrieve',)
     permission_classes = (IsAuthorOrAdmin,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        return Recipe.objects.for_viewer(self.request.user)
+
+    def get_conditional_validators(self, request, pk=None, **kwargs):
+        try:
+            recipe_updated = Recipe.objects.filter(pk=pk).values_list(
+                'updated',
+                flat=True
+            ).first()
+        except (TypeError, ValueError):
+            return None, None
+        if recipe_updated is None:
+            return None, None
+        if request.user.is_anonymous:
+            return make_etag('recipe', pk, recipe_updated), recipe_updated
+        key = viewer_version(request.user.id)
+        token, viewer_updated = get_versions(key).get(key, ('', None))
+        return (
+            make_etag('recipe', pk, recipe_updated, request.user.id, token),
+            max(filter(None, (recipe_updated, viewer_updated)))
+        )
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.list_rows, request, *args, **kwargs
+        )
+
+    def list_rows(self, request, *args, **kwargs):
+        return self.rows_response(self.filter_queryset(self.get_queryset()))
+
+    def rows_response(self, queryset):
+        rows = get_recipe_rows(queryset)
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(
+                get_recipe_representations(list(rows), self.request)
+            )
+        return self.get_paginated_response(
+            get_recipe_representations(page, self.request)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        response = self.conditional_response(
+            self.retrieve_row, request, *args, **kwargs
+        )
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def retrieve_row(self, request, pk=None, **kwargs):
+        row = generics.get_object_or_404(
+            get_recipe_rows(self.get_queryset()),
+            pk=pk
+        )
+        representations = get_recipe_representations([row], request)
+        if not representations:
+            raise Http404
+        return Response(representations[0])
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated],
+        url_path='feed'
+    )
+    def feed(self, request):
+        return self.rows_response(self.filter_queryset(
+            get_feed(request.user).for_viewer(request.user)
+        ))
+
     @action(
         detail=True,
         methods=['get'],
         url_path='get-link'
     )
     def get_link(self, request, pk=None):
-        recipe = self.get_object()
-        url = request.build_absolute_uri(f'/recipes/{recipe.id}/')
-        s = pyshorteners.Shortener()
-        try:
-            short_url = s.tinyurl.short(url)
-            return Response({"short-link": short_url})
-        except Exception as e:
-            return Response(
-                {"error": str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        if not pk.isdigit() or not recipe_exists(int(pk)):
+            raise Http404
+        return Response({
+            'short-link': request.build_absolute_uri(
+                reverse('short-link', args=(make_short_code(int(pk)),))
             )
+        })
 
     @action(
         detail=True,
@@ -210,11 +337,20 @@ class RecipeViewSet(viewsets.ModelViewSet, ActionMixin):
     def shopping_cart(self, request, pk=None):
         return self.handle_action(
             model=ShoppingCart,
-            serializer_class=ShoppingCardSerializer,
+            serializer_class=ShortRecipeSerializer,
             request=request,
-            recipe=self.get_object()
+            instance=generics.get_object_or_404(Recipe, pk=pk)
         )
 
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[IsAuthenticated],
+        url_path='shopping_cart/batch'
+    )
+    def shopping_cart_batch(self, request):
+        return self.handle_batch_action(ShoppingCart, request)
+
     @action(
         detail=False,
         methods=['get'],
@@ -222,40 +358,21 @@ class RecipeViewSet(viewsets.ModelViewSet, ActionMixin):
         url_path='download_shopping_cart'
     )
     def download_shopping_cart(self, request):
-        recipes = Recipe.objects.filter(
-            shoppingcart__user=request.user
-        ).prefetch_related('recipe_ingredients__ingredient')
-        shopping_data = {}
-        recipe_list = []
-        for recipe in recipes:
-            recipe_details = f"\n{recipe.name}:\n"
-            recipe_ingredients = recipe.recipe_ingredients.all()
-            for recipe_ingredient in recipe_ingredients:
-                name = recipe_ingredient.ingredient.name
-                measurement_unit = (
-                    recipe_ingredient.ingredient.measurement_unit
-                )
-                amount = recipe_ingredient.amount
-                recipe_details += f"  {name} - {amount} {measurement_unit}\n"
-                if name in shopping_data:
-                    shopping_data[name]['amount'] += amount
-                else:
-                    shopping_data[name] = {
-                        'measurement_unit': measurement_unit,
-                        'amount': amount
-                    }
-            recipe_list.append(recipe_details)
-        filename = "shopping-list.txt"
-        content = "\n".join(recipe_list)
-        content += "\nShopping List:\n"
-        for ingredient, data in shopping_data.items():
-            content += (
-                f"{ingredient} - {data['amount']} {data['measurement_unit']};"
+        file_format = request.query_params.get('file_format', 'txt')
+        if file_format not in SHOPPING_LIST_FORMATS:
+            return Response(
+                {'detail': 'Неподдерживаемый формат файла.'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            content += "\n"
-        response = HttpResponse(content, content_type='text/plain',
-                                status=status.HTTP_200_OK)
-        response['Content-Disposition'] = f'attachment; filename={filename}'
+        content_type, render = SHOPPING_LIST_FORMATS[file_format]
+        response = StreamingHttpResponse(
+            render(request.user),
+            content_type=content_type,
+            status=status.HTTP_200_OK
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename=shopping-list.{file_format}'
+        )
         return response
 
     @action(
@@ -269,5 +386,30 @@ class RecipeViewSet(viewsets.ModelViewSet, ActionMixin):
             model=Favorite,
             serializer_class=ShortRecipeSerializer,
             request=request,
-            recipe=self.get_object()
+            instance=generics.get_object_or_404(Recipe, pk=pk)
         )
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[IsAuthenticated],
+        url_path='favorite/batch'
+    )
+    def favorite_batch(self, request):
+        return self.handle_batch_action(Favorite, request)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics(request):
+    return Response({
+        **route_metrics.snapshot(),
+        'response_cache': response_cache.stats(),
+    })
+
+
+def short_link_redirect(request, code):
+    path = resolve_short_code(code)
+    if path is None:
+        raise Http404
+    return redirect(path)
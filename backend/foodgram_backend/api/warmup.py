@@ -0,0 +1,45 @@
+import logging
+import threading
+
+from django.db import connections
+
+from .indexes import ingredient_index
+
+logger = logging.getLogger(__name__)
+
+BARRIER_TIMEOUT = 10
+
+
+def warm_caches():
+    """Строит кэши процесса до fork, чтобы воркеры получили их готовыми.
+
+    Соединения с БД закрываются: дочерние процессы не должны делить
+    сокеты, открытые в мастере.
+    """
+    try:
+        ingredient_index.warm()
+    except Exception:
+        logger.exception('Не удалось прогреть индекс ингредиентов')
+    finally:
+        connections.close_all()
+
+
+def warm_connections(barrier=None):
+    """Открывает постоянные соединения с БД в текущем потоке воркера.
+
+    barrier не дает одному потоку пула забрать задачи остальных.
+    """
+    for connection in connections.all():
+        if not connection.settings_dict['CONN_MAX_AGE']:
+            continue
+        try:
+            connection.ensure_connection()
+        except Exception:
+            logger.exception(
+                'Не удалось открыть соединение с БД %s', connection.alias
+            )
+    if barrier is not None:
+        try:
+            barrier.wait(timeout=BARRIER_TIMEOUT)
+        except threading.BrokenBarrierError:
+            pass
@@ -0,0 +1,13 @@
+from api import async_views
+from django.urls import path
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('api/recipes/', async_views.recipe_list),
+    path('api/recipes/<int:pk>/', async_views.recipe_detail),
+    path('api/recipes/<int:pk>/favorite/', async_views.favorite),
+    path('api/recipes/<int:pk>/shopping_cart/', async_views.shopping_cart),
+    path('api/users/subscriptions/', async_views.subscriptions),
+    path('api/users/<int:pk>/subscribe/', async_views.subscribe),
+] + sync_urlpatterns
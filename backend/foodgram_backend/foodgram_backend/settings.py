@@ -24,6 +24,8 @@ INSTALLED_APPS = [
     'api.apps.ApiConfig',
 ]
 MIDDLEWARE = [
+    'api.middleware.HealthCheckMiddleware',
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -32,7 +34,11 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
-ROOT_URLCONF = 'foodgram_backend.urls'
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+ROOT_URLCONF = (
+    'foodgram_backend.async_urls' if SERVER_MODE == 'asgi'
+    else 'foodgram_backend.urls'
+)
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -49,6 +55,7 @@ TEMPLATES = [
     },
 ]
 WSGI_APPLICATION = 'foodgram_backend.wsgi.application'
+ASGI_APPLICATION = 'foodgram_backend.asgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -56,9 +63,36 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        # В режиме ASGI соединения живут в потоках sync_to_async, поэтому
+        # держать их открытыми между запросами там бессмысленно.
+        'CONN_MAX_AGE': int(os.getenv(
+            'CONN_MAX_AGE',
+            0 if SERVER_MODE == 'asgi' else 60
+        )),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
+RECIPE_CACHE_SIZE = int(os.getenv('RECIPE_CACHE_SIZE', 20000))
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'recipes': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'recipes',
+        'OPTIONS': {'MAX_ENTRIES': RECIPE_CACHE_SIZE},
+    },
+}
+if os.getenv('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL'),
+    }
+    CACHES['recipes'] = {
+        **CACHES['default'],
+        'KEY_PREFIX': 'recipes',
+    }
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -84,7 +118,43 @@ REST_FRAMEWORK = {
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.CustomPageNumberPagination',
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+API_PAGINATION_MODE = os.getenv('API_PAGINATION_MODE', 'page')
+API_PAGINATION_COUNT = os.getenv('API_PAGINATION_COUNT', 'exact')
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', 100))
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', 300))
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 1000))
+FEED_BACKFILL = int(os.getenv('FEED_BACKFILL', 50))
+FEED_SIZE = int(os.getenv('FEED_SIZE', 500))
+SHORT_LINK_CACHE_TIMEOUT = int(os.getenv('SHORT_LINK_CACHE_TIMEOUT', 600))
+RECIPE_CACHE_ALIAS = os.getenv('RECIPE_CACHE_ALIAS', 'recipes')
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', 86400))
+IMAGE_VARIANTS_ENABLED = os.getenv('IMAGE_VARIANTS_ENABLED', '1') == '1'
+IMAGE_VARIANTS = {
+    'thumbnail': (160, 160),
+    'card': (480, 480),
+    'full': (1280, 1280),
 }
+IMAGE_VARIANT_FORMAT = os.getenv('IMAGE_VARIANT_FORMAT', 'WEBP').upper()
+IMAGE_VARIANT_QUALITY = int(os.getenv('IMAGE_VARIANT_QUALITY', 80))
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', 2))
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+RESPONSE_CACHE_BACKEND = os.getenv(
+    'RESPONSE_CACHE_BACKEND',
+    'api.cache.LRUBackend'
+)
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 512))
+RESPONSE_CACHE_ALIAS = os.getenv('RESPONSE_CACHE_ALIAS', 'default')
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 3600))
 DJOSER = {
     'LOGIN_FIELD': 'email'
 }
@@ -98,4 +168,12 @@ STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/media/'
+STORAGES = {
+    'default': {
+        'BACKEND': 'api.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -0,0 +1,50 @@
+"""Настройки gunicorn для продакшена.
+
+Воркеров по умолчанию на один больше, чем ядер, и в каждом пул потоков:
+запросы большую часть времени ждут БД. В режиме ASGI потоки заменяет
+цикл событий uvicorn. Приложение загружается в мастере до fork, поэтому
+кэши процесса строятся один раз и достаются воркерам готовыми.
+"""
+import multiprocessing
+import os
+import threading
+
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv(
+    'GUNICORN_WORKERS',
+    multiprocessing.cpu_count() + 1
+))
+if SERVER_MODE == 'asgi':
+    wsgi_app = 'foodgram_backend.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'foodgram_backend.wsgi:application'
+    threads = int(os.getenv('GUNICORN_THREADS', 4))
+    worker_class = 'gthread' if threads > 1 else 'sync'
+preload_app = True
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = max_requests // 10
+accesslog = '-'
+
+
+def when_ready(server):
+    from api.warmup import warm_caches
+
+    warm_caches()
+
+
+def post_worker_init(worker):
+    from api.warmup import warm_connections
+
+    pool = getattr(worker, 'tpool', None)
+    if pool is None:
+        warm_connections()
+        return
+    barrier = threading.Barrier(worker.cfg.threads)
+    for _ in range(worker.cfg.threads):
+        pool.submit(warm_connections, barrier)